@@ -1,9 +1,11 @@
 import os
+import asyncio
 import logging
 import re
+import weakref
 import httpx
-from datetime import datetime, timedelta
-from typing import Dict
+from cachetools import TTLCache
+from typing import Dict, Optional
 
 from telegram import (
     Update, 
@@ -13,6 +15,7 @@ from telegram import (
     KeyboardButton
 )
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -32,35 +35,84 @@ logger = logging.getLogger(__name__)
 # Конфигурация из переменных окружения
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://api-gateway:8000')
+# Публичный HTTPS-адрес для webhook; если не задан, бот работает через long polling
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET') or None
+PORT = int(os.getenv('PORT', '8443'))
 
 # Состояния диалога
 WAITING_FOR_REPO, WAITING_FOR_PERIOD = range(2)
 
-# --- Вспомогательные функции ---
+# Лимит длины сообщения Telegram и размер части при разбиении
+MESSAGE_LIMIT = 4096
+MESSAGE_CHUNK = 4000
+
+# Формат ввода репозитория: owner/repo
+REPO_RE = re.compile(r'[\w\-.]+/[\w\-.]+')
+
+# Кеш метаданных репозиториев (owner, repo) -> ответ /api/repo
+REPO_CACHE = TTLCache(maxsize=1024, ttl=300)
+
+# Блокировки по chat_id: анализы одного чата выполняются по очереди.
+# Слабые ссылки: блокировка удаляется, когда ее больше не держит и не ждет ни одна задача
+CHAT_LOCKS: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
 
-def get_main_menu():
-    """Создает клавиатуру главного меню"""
-    keyboard = [
+# Общий HTTP-клиент к API Gateway (создается в post_init, закрывается в post_shutdown)
+http_client: Optional[httpx.AsyncClient] = None
+
+# Клавиатуры неизменяемы, поэтому создаются один раз при импорте
+MAIN_MENU = ReplyKeyboardMarkup(
+    [
         [KeyboardButton("🔍 Анализ репозитория")],
         [KeyboardButton("📜 История запросов"), KeyboardButton("📖 Помощь")],
         [KeyboardButton("🤖 О боте")]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    ],
+    resize_keyboard=True
+)
+CANCEL_MENU = ReplyKeyboardMarkup([[KeyboardButton("❌ Отмена")]], resize_keyboard=True)
+PERIOD_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📅 30 дней", callback_data="30"),
+     InlineKeyboardButton("📅 90 дней", callback_data="90")],
+    [InlineKeyboardButton("📅 Весь год", callback_data="365")]
+])
+
+# --- Вспомогательные функции ---
 
 async def call_api(endpoint: str, method: str = "GET", json_data: Dict = None):
     """Асинхронный вызов вашего API Gateway"""
-    url = f"{API_GATEWAY_URL}{endpoint}"
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        try:
-            if method == "GET":
-                response = await client.get(url)
-            else:
-                response = await client.post(url, json=json_data)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Ошибка при вызове API {url}: {e}")
-            return None
+    try:
+        if method == "GET":
+            response = await http_client.get(endpoint)
+        else:
+            response = await http_client.post(endpoint, json=json_data)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.error(f"Ошибка при вызове API {endpoint}: {e}")
+        return None
+
+async def reply_long_text(message, text: str, **kwargs):
+    """Отправка длинного текста частями в исходном порядке (паузы на 429 берет на себя AIORateLimiter)"""
+    if len(text) <= MESSAGE_LIMIT:
+        await message.reply_text(text, **kwargs)
+        return
+    for i in range(0, len(text), MESSAGE_CHUNK):
+        await message.reply_text(text[i:i + MESSAGE_CHUNK], **kwargs)
+
+async def post_init(application: Application):
+    """Создание общего HTTP-клиента с keep-alive при старте бота"""
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=API_GATEWAY_URL,
+        timeout=180.0,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60)
+    )
+
+async def post_shutdown(application: Application):
+    """Закрытие HTTP-клиента при остановке бота"""
+    if http_client is not None:
+        await http_client.aclose()
 
 # --- Обработчики команд и кнопок меню ---
 
@@ -70,7 +122,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "👋 Привет! Я бот для аналитики GitHub.\n\n"
         "Я могу проанализировать активность в репозитории и запросить "
         "рекомендации по улучшению проекта у **Mistral AI**.",
-        reply_markup=get_main_menu(),
+        reply_markup=MAIN_MENU,
         parse_mode="Markdown"
     )
 
@@ -93,11 +145,13 @@ async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("История запросов пока пуста.")
         return
     
-    text = "📜 *Последние проанализированные проекты:*\n\n"
-    for rec in data['history']:
-        text += f"• `{rec['owner']}/{rec['repo_name']}`\n  └ Коммитов: {rec.get('total_commits', 0)}\n"
+    parts = ["📜 *Последние проанализированные проекты:*\n\n"]
+    parts.extend(
+        f"• `{rec['owner']}/{rec['repo_name']}`\n  └ Коммитов: {rec.get('total_commits', 0)}\n"
+        for rec in data['history']
+    )
     
-    await update.message.reply_text(text, parse_mode="Markdown")
+    await update.message.reply_text("".join(parts), parse_mode="Markdown")
 
 # --- Логика анализа (Conversation) ---
 
@@ -107,7 +161,7 @@ async def analyze_init(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔍 Введите путь к репозиторию в формате `owner/repo`.\n"
         "Пример: `facebook/react` или `python/cpython`",
         parse_mode="Markdown",
-        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ Отмена")]], resize_keyboard=True)
+        reply_markup=CANCEL_MENU
     )
     return WAITING_FOR_REPO
 
@@ -116,10 +170,10 @@ async def receive_repo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     repo_input = update.message.text.strip()
     
     if repo_input == "❌ Отмена":
-        await update.message.reply_text("Действие отменено.", reply_markup=get_main_menu())
+        await update.message.reply_text("Действие отменено.", reply_markup=MAIN_MENU)
         return ConversationHandler.END
 
-    if not re.match(r'^[\w\-\.]+/[\w\-\.]+$', repo_input):
+    if not REPO_RE.fullmatch(repo_input):
         await update.message.reply_text("❌ Неверный формат! Попробуйте еще раз (owner/repo):")
         return WAITING_FOR_REPO
     
@@ -127,21 +181,20 @@ async def receive_repo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.update({"owner": owner, "repo": repo})
     
     await update.message.reply_text(f"⏳ Проверяю доступность `{repo_input}`...", parse_mode="Markdown")
-    data = await call_api(f"/api/repo/{owner}/{repo}")
+    data = REPO_CACHE.get((owner, repo))
+    if data is None:
+        data = await call_api(f"/api/repo/{owner}/{repo}")
+        if data and data.get('success'):
+            REPO_CACHE[(owner, repo)] = data
     
     if not data or not data.get('success'):
         await update.message.reply_text("❌ Репозиторий не найден или недоступен. Проверьте имя:")
         return WAITING_FOR_REPO
 
-    keyboard = [
-        [InlineKeyboardButton("📅 30 дней", callback_data="30"),
-         InlineKeyboardButton("📅 90 дней", callback_data="90")],
-        [InlineKeyboardButton("📅 Весь год", callback_data="365")]
-    ]
     await update.message.reply_text(
         f"✅ Репозиторий найден: *{data['repo_info']['full_name']}*\n"
         f"Выберите период для анализа данных и генерации советов Mistral:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=PERIOD_KEYBOARD,
         parse_mode="Markdown"
     )
     return WAITING_FOR_PERIOD
@@ -161,48 +214,59 @@ async def receive_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
     
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    # Отправляем запрос на шлюз, который дернет сервис аналитики
-    data = await call_api("/api/analyze", method="POST", json_data={
-        "owner": owner,
-        "repo_name": repo,
-        "start_date": start_date.isoformat() + "Z",
-        "end_date": end_date.isoformat() + "Z"
-    })
-    
-    if not data or not data.get('success'):
-        await query.message.reply_text("❌ Произошла ошибка при анализе данных.", reply_markup=get_main_menu())
-        return ConversationHandler.END
+    # Долгий анализ уходит в фоновую задачу, обработчик сразу освобождается
+    context.application.create_task(
+        run_analysis(query.message, owner, repo, days),
+        update=update
+    )
+    return ConversationHandler.END
 
-    # Сборка итогового сообщения
-    stats = data.get('commit_stats', {})
-    res = f"📊 *ИТОГИ АНАЛИЗА: {owner}/{repo}*\n"
-    res += f"━━━━━━━━━━━━━━━━━━━━\n"
-    res += f"💾 Всего коммитов: `{stats.get('total_commits', 0)}`\n"
-    res += f"👥 Активных авторов: `{data.get('total_contributors', 0)}`\n"
-    
-    # Вывод рекомендаций Mistral (если сервис их прислал)
-    mistral_rec = data.get('ai_recommendations') or data.get('ai_summary')
-    if mistral_rec:
-        res += f"\n💡 *РЕКОМЕНДАЦИИ MISTRAL AI:*\n{mistral_rec}"
-    else:
-        res += f"\n⚠️ Рекомендации от нейросети временно недоступны."
+def get_chat_lock(chat_id: int) -> asyncio.Lock:
+    """Блокировка чата; вызывающая задача держит сильную ссылку, пока она нужна"""
+    lock = CHAT_LOCKS.get(chat_id)
+    if lock is None:
+        lock = CHAT_LOCKS[chat_id] = asyncio.Lock()
+    return lock
 
-    # Отправка (с защитой от слишком длинных сообщений)
-    if len(res) > 4096:
-        for i in range(0, len(res), 4000):
-            await query.message.reply_text(res[i:i+4000], parse_mode="Markdown")
-    else:
-        await query.message.reply_text(res, parse_mode="Markdown")
-    
-    await query.message.reply_text("Чем еще я могу помочь?", reply_markup=get_main_menu())
-    return ConversationHandler.END
+async def run_analysis(message, owner: str, repo: str, days: int):
+    """Фоновый анализ репозитория и отправка результата в чат"""
+    lock = get_chat_lock(message.chat_id)
+    async with lock:
+        # Отправляем запрос на шлюз, который дернет сервис аналитики (даты считает шлюз)
+        data = await call_api("/api/analyze", method="POST", json_data={
+            "owner": owner,
+            "repo_name": repo,
+            "period_days": days
+        })
+        
+        if not data or not data.get('success'):
+            await message.reply_text("❌ Произошла ошибка при анализе данных.", reply_markup=MAIN_MENU)
+            return
+
+        # Сборка итогового сообщения
+        stats = data.get('commit_stats', {})
+        parts = [
+            f"📊 *ИТОГИ АНАЛИЗА: {owner}/{repo}*\n",
+            "━━━━━━━━━━━━━━━━━━━━\n",
+            f"💾 Всего коммитов: `{stats.get('total_commits', 0)}`\n",
+            f"👥 Активных авторов: `{data.get('total_contributors', 0)}`\n"
+        ]
+        
+        # Вывод рекомендаций Mistral (если сервис их прислал)
+        mistral_rec = data.get('ai_recommendations') or data.get('ai_summary')
+        if mistral_rec:
+            parts.append(f"\n💡 *РЕКОМЕНДАЦИИ MISTRAL AI:*\n{mistral_rec}")
+        else:
+            parts.append("\n⚠️ Рекомендации от нейросети временно недоступны.")
+
+        # Отправка (с защитой от слишком длинных сообщений)
+        await reply_long_text(message, "".join(parts), parse_mode="Markdown")
+        
+        await message.reply_text("Чем еще я могу помочь?", reply_markup=MAIN_MENU)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сброс любого состояния"""
-    await update.message.reply_text("Действие отменено.", reply_markup=get_main_menu())
+    await update.message.reply_text("Действие отменено.", reply_markup=MAIN_MENU)
     return ConversationHandler.END
 
 # --- Запуск бота ---
@@ -212,7 +276,14 @@ def main():
         logger.error("Ошибка: TELEGRAM_BOT_TOKEN не задан!")
         return
 
-    app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .rate_limiter(AIORateLimiter(max_retries=3))
+        .build()
+    )
     
     # Настройка диалогового обработчика
     conv_handler = ConversationHandler(
@@ -244,8 +315,18 @@ def main():
     # Добавляем диалог
     app.add_handler(conv_handler)
     
-    logger.info("Бот запущен. Ожидание сообщений...")
-    app.run_polling()
+    if TELEGRAM_WEBHOOK_URL:
+        logger.info(f"Бот запущен в режиме webhook на порту {PORT}")
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{TELEGRAM_WEBHOOK_URL.rstrip('/')}/{TELEGRAM_BOT_TOKEN}",
+            secret_token=TELEGRAM_WEBHOOK_SECRET
+        )
+    else:
+        logger.info("Бот запущен. Ожидание сообщений...")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,9 +3,9 @@ Web Client - веб-интерфейс для аналитики GitHub
 Port: 8080
 """
 import os
+import asyncio
 import logging
-import hashlib
-import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional
 
@@ -13,7 +13,10 @@ from fastapi import FastAPI, Form, Request, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-import requests
+from cachetools import TTLCache
+from jinja2 import FileSystemBytecodeCache
+import httpx
+import orjson
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,7 +25,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="GitHub Analytics Web Client")
+# Конфигурация
+API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
+
+# Кеш ответов API Gateway: метаданные репозитория меняются медленно,
+# история обновляется после каждого анализа
+REPO_CACHE = TTLCache(maxsize=1024, ttl=300)
+HISTORY_CACHE = TTLCache(maxsize=64, ttl=30)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Общий HTTP-клиент к API Gateway на все время жизни приложения"""
+    app.state.http = httpx.AsyncClient(
+        base_url=API_GATEWAY_URL,
+        timeout=120,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60)
+    )
+    # Компилируем все шаблоны заранее, чтобы первый запрос не платил за разбор
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(title="GitHub Analytics Web Client", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -35,38 +63,63 @@ app.add_middleware(
 
 # --- Настройка Jinja2 и кастомных фильтров ---
 templates = Jinja2Templates(directory="templates")
-
-def jinja2_hash_filter(value):
-    """Превращает строку в числовой хэш для генерации цвета"""
-    hash_object = hashlib.md5(str(value).encode('utf-8'))
-    return int(hash_object.hexdigest(), 16)
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+templates.env.auto_reload = False
 
 def jinja2_rjust_filter(value, width, fillchar=' '):
     return str(value).rjust(width, fillchar)
 
-templates.env.filters["hash"] = jinja2_hash_filter
 templates.env.filters["rjust"] = jinja2_rjust_filter
 
-# Конфигурация
-API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://localhost:8000')
-
-def call_api(endpoint: str, method: str = "GET", json_data: dict = None):
-    url = f"{API_GATEWAY_URL}{endpoint}"
+async def call_api(request: Request, endpoint: str, method: str = "GET", json_data: dict = None):
+    client: httpx.AsyncClient = request.app.state.http
     try:
         if method == "GET":
-            response = requests.get(url, timeout=120)
+            response = await client.get(endpoint)
         elif method == "POST":
-            response = requests.post(url, json=json_data, timeout=120)
+            response = await client.post(endpoint, json=json_data)
         
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Репозиторий не найден")
             
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error calling {url}: {e}")
+        return orjson.loads(response.content)
+    except httpx.HTTPError as e:
+        logger.error(f"Error calling {endpoint}: {e}")
         raise HTTPException(status_code=502, detail=f"API unavailable")
 
+def build_stats(analysis_data: dict) -> dict:
+    """Плоский набор метрик для шаблона repo_details.html"""
+    commit_stats = analysis_data.get('commit_stats') or {}
+    issue_stats = analysis_data.get('issue_stats') or {}
+    pr_stats = analysis_data.get('pr_stats') or {}
+    return {
+        'totalCommits': commit_stats.get('total_commits', 0),
+        'totalContributors': analysis_data.get('total_contributors', 0),
+        'avgCommitsPerDay': commit_stats.get('average_commits_per_day', 0),
+        'activityIndex': analysis_data.get('activity_index', 0),
+        'analysis_period_days': analysis_data.get('analysis_period_days', 0),
+        'mostActiveDay': commit_stats.get('most_active_day'),
+        'mostActiveAuthor': commit_stats.get('most_active_author'),
+        'totalIssues': issue_stats.get('total_issues', 0),
+        'openIssues': issue_stats.get('open_issues', 0),
+        'totalPRs': pr_stats.get('total_prs', 0),
+        'mergedPRs': pr_stats.get('merged_prs', 0),
+        
+        # AI-поля уже разобраны analytics-service
+        'ai_analysis': analysis_data.get('ai_analysis', ''),
+        'ai_summary': analysis_data.get('ai_summary', ''),
+        'ai_insights': analysis_data.get('ai_insights', {}),
+        'ai_recommendations': analysis_data.get('ai_recommendations', []),
+        
+        'languages': (analysis_data.get('language_stats') or {}).get('languages', {}),
+        'top_contributors': (analysis_data.get('contributors') or [])[:10]
+    }
+
+async def render_template(name: str, context: dict) -> HTMLResponse:
+    """Рендер тяжелых шаблонов в пуле потоков, чтобы не блокировать event loop"""
+    return await asyncio.to_thread(templates.TemplateResponse, name, context)
+
 @app.get("/")
 async def index_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -74,8 +127,11 @@ async def index_page(request: Request):
 @app.get("/repo/{owner}/{repo_name}", response_class=HTMLResponse)
 async def repo_details_page(request: Request, owner: str, repo_name: str):
     try:
-        repo_data = call_api(f"/api/repo/{owner}/{repo_name}")
-        return templates.TemplateResponse(
+        repo_data = REPO_CACHE.get((owner, repo_name))
+        if repo_data is None:
+            repo_data = await call_api(request, f"/api/repo/{owner}/{repo_name}")
+            REPO_CACHE[(owner, repo_name)] = repo_data
+        return await render_template(
             "repo_details.html",
             {
                 "request": request,
@@ -96,7 +152,8 @@ async def get_stats_post(
     end_date: str = Form(...)
 ):
     try:
-        analysis_data = call_api(
+        analysis_data = await call_api(
+            request,
             "/api/analyze",
             method="POST",
             json_data={
@@ -106,57 +163,12 @@ async def get_stats_post(
                 "end_date": end_date + "T23:59:59Z"
             }
         )
+        # Новая запись в истории: сбрасываем закешированные страницы
+        HISTORY_CACHE.clear()
         
-        # --- ЛОГИКА ПАРСИНГА AI JSON ---
-        ai_raw = analysis_data.get('ai_analysis', '')
-        ai_content = ""
-        ai_summary = analysis_data.get('ai_summary', '')
-        ai_insights = analysis_data.get('ai_insights', {})
-        ai_recommendations = analysis_data.get('ai_recommendations', [])
-
-        # Если AI прислал строку, которая похожа на JSON, парсим её
-        if isinstance(ai_raw, str) and (ai_raw.strip().startswith('{') or "```json" in ai_raw):
-            try:
-                # Очистка от markdown оберток
-                json_str = ai_raw
-                if "```json" in json_str:
-                    json_str = json_str.split("```json")[1].split("```")[0].strip()
-                
-                parsed_json = json.loads(json_str)
-                ai_content = parsed_json.get('analysis', parsed_json.get('detailed_analysis', ''))
-                ai_summary = parsed_json.get('summary', ai_summary)
-                ai_insights = parsed_json.get('insights', ai_insights)
-                ai_recommendations = parsed_json.get('recommendations', ai_recommendations)
-            except Exception as e:
-                logger.warning(f"Failed to parse AI JSON: {e}")
-                ai_content = ai_raw # Оставляем как есть, если не JSON
-        else:
-            ai_content = ai_raw
-
-        stats = {
-            'totalCommits': analysis_data.get('commit_stats', {}).get('total_commits', 0),
-            'totalContributors': analysis_data.get('total_contributors', 0),
-            'avgCommitsPerDay': analysis_data.get('commit_stats', {}).get('average_commits_per_day', 0),
-            'activityIndex': analysis_data.get('activity_index', 0),
-            'analysis_period_days': analysis_data.get('analysis_period_days', 0),
-            'mostActiveDay': analysis_data.get('commit_stats', {}).get('most_active_day'),
-            'mostActiveAuthor': analysis_data.get('commit_stats', {}).get('most_active_author'),
-            'totalIssues': analysis_data.get('issue_stats', {}).get('total_issues', 0),
-            'openIssues': analysis_data.get('issue_stats', {}).get('open_issues', 0),
-            'totalPRs': analysis_data.get('pr_stats', {}).get('total_prs', 0),
-            'mergedPRs': analysis_data.get('pr_stats', {}).get('merged_prs', 0),
-            
-            # Обновленные поля после парсинга
-            'ai_analysis': ai_content,
-            'ai_summary': ai_summary,
-            'ai_insights': ai_insights,
-            'ai_recommendations': ai_recommendations,
-            
-            'languages': analysis_data.get('language_stats', {}).get('languages', {}),
-            'top_contributors': analysis_data.get('contributors', [])[:10]
-        }
+        stats = build_stats(analysis_data)
         
-        return templates.TemplateResponse(
+        return await render_template(
             "repo_details.html",
             {
                 "request": request,
@@ -172,8 +184,11 @@ async def get_stats_post(
 @app.get("/history", response_class=HTMLResponse)
 async def history_page(request: Request, page: int = 1):
     try:
-        history_data = call_api(f"/api/history?limit=20&offset={(page-1)*20}")
-        return templates.TemplateResponse(
+        history_data = HISTORY_CACHE.get(page)
+        if history_data is None:
+            history_data = await call_api(request, f"/api/history?limit=20&offset={(page-1)*20}")
+            HISTORY_CACHE[page] = history_data
+        return await render_template(
             "history.html",
             {
                 "request": request,
@@ -4,15 +4,18 @@ Port: 8002
 """
 import os
 import logging
-import json
-import re
-from typing import Dict, Any, List
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-import requests
+from cachetools import TTLCache
+import httpx
+import orjson
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,7 +24,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Analytics Service", version="1.1.0")
+MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY', '')
+MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+MISTRAL_MODEL = "mistral-large-latest"
+
+# Кеш готовых ответов AI: повторный анализ тех же данных не вызывает Mistral
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', '3600'))
+ANALYSIS_CACHE = TTLCache(maxsize=256, ttl=ANALYSIS_CACHE_TTL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Общий клиент: TCP/TLS соединение с api.mistral.ai переиспользуется между запросами"""
+    app.state.http = httpx.AsyncClient(
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {MISTRAL_API_KEY}"
+        },
+        timeout=110,
+        http2=True
+    )
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="Analytics Service",
+    version="1.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,10 +63,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY', '')
-MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
-MISTRAL_MODEL = "mistral-large-latest"
-
 class AnalyticsRequest(BaseModel):
     repo_name: str
     owner: str
@@ -52,55 +80,75 @@ async def health_check():
 @app.post("/analyze")
 async def analyze_with_ai(request: AnalyticsRequest):
     if not MISTRAL_API_KEY:
-        return {
-            "success": False,
-            "error": "Mistral API key not configured",
-            "analysis": generate_fallback_analysis(request.activity_data),
-            "recommendations": generate_fallback_recommendations(request.activity_data),
-            "insights": {"strengths": [], "weaknesses": [], "trends": [], "health_score": "N/A"},
-            "summary": "AI сервис не настроен"
-        }
+        return build_fallback_result(
+            request.activity_data, "Mistral API key not configured", "AI сервис не настроен", "N/A"
+        )
     
     try:
         logger.info(f"Starting AI analysis for {request.owner}/{request.repo_name}")
         activity_summary = prepare_activity_summary(request.activity_data)
-        prompt = create_analysis_prompt(request.owner, request.repo_name, activity_summary)
+        cache_key = make_cache_key(request.owner, request.repo_name, activity_summary)
+        cached = ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"Analysis cache hit for {request.owner}/{request.repo_name}")
+            return cached
         
-        ai_response_text = call_mistral_api(prompt)
-        analysis_result = parse_ai_response(ai_response_text)
+        prompt = create_analysis_prompt(request.owner, request.repo_name, activity_summary)
         
-        return {
-            "success": True,
-            "analysis": analysis_result['analysis'],
-            "recommendations": analysis_result['recommendations'],
-            "insights": analysis_result['insights'],
-            "summary": analysis_result['summary']
-        }
+        ai_response_text = await call_mistral_api(prompt)
+        result = build_analysis_result(ai_response_text)
+        ANALYSIS_CACHE[cache_key] = result
+        return result
     
     except Exception as e:
         logger.error(f"Error during AI analysis: {e}", exc_info=True)
-        return {
-            "success": False,
-            "error": str(e),
-            "analysis": generate_fallback_analysis(request.activity_data),
-            "recommendations": generate_fallback_recommendations(request.activity_data),
-            "insights": {"strengths": [], "weaknesses": [], "trends": [], "health_score": "0"},
-            "summary": "Ошибка при генерации аналитики"
-        }
+        return build_fallback_result(
+            request.activity_data, str(e), "Ошибка при генерации аналитики", "0"
+        )
+
+def build_analysis_result(ai_response_text: str) -> Dict[str, Any]:
+    analysis_result = parse_ai_response(ai_response_text)
+    return {
+        "success": True,
+        "analysis": analysis_result['analysis'],
+        "recommendations": analysis_result['recommendations'],
+        "insights": analysis_result['insights'],
+        "summary": analysis_result['summary']
+    }
+
+def build_fallback_result(data: Dict[str, Any], error: str, summary: str, health_score: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": error,
+        "analysis": generate_fallback_analysis(data),
+        "recommendations": generate_fallback_recommendations(data),
+        "insights": {"strengths": [], "weaknesses": [], "trends": [], "health_score": health_score},
+        "summary": summary
+    }
 
 def prepare_activity_summary(data: Dict[str, Any]) -> str:
-    repo_info = data.get('repo_info', {})
-    commit_stats = data.get('commit_stats', {})
+    repo_info = data.get('repo_info') or {}
+    commit_stats = data.get('commit_stats') or {}
+    issue_stats = data.get('issue_stats') or {}
+    pr_stats = data.get('pr_stats') or {}
+    languages = orjson.dumps((data.get('language_stats') or {}).get('languages', {})).decode()
     
-    summary = f"""
-    Repo: {repo_info.get('full_name')} | Stars: {repo_info.get('stargazers_count')}
-    Period: {data.get('analysis_period_days')} days | Total Commits: {commit_stats.get('total_commits')}
-    Activity Index: {data.get('activity_index')}% | Authors: {data.get('total_contributors')}
-    Languages: {json.dumps(data.get('language_stats', {}).get('languages', {}))}
-    Issues O/C: {data.get('issue_stats', {}).get('open_issues')}/{data.get('issue_stats', {}).get('closed_issues')}
-    PRs O/M: {data.get('pr_stats', {}).get('open_prs')}/{data.get('pr_stats', {}).get('merged_prs')}
-    """
-    return summary.strip()
+    return (
+        f"Repo: {repo_info.get('full_name')} | Stars: {repo_info.get('stargazers_count')}\n"
+        f"Period: {data.get('analysis_period_days')} days | Total Commits: {commit_stats.get('total_commits')}\n"
+        f"Activity Index: {data.get('activity_index')}% | Authors: {data.get('total_contributors')}\n"
+        f"Languages: {languages}\n"
+        f"Issues O/C: {issue_stats.get('open_issues')}/{issue_stats.get('closed_issues')}\n"
+        f"PRs O/M: {pr_stats.get('open_prs')}/{pr_stats.get('merged_prs')}"
+    )
+
+def make_cache_key(owner: str, repo_name: str, activity_summary: str) -> str:
+    """Стабильный ключ кеша: хэш репозитория и сводки данных, попадающих в промпт"""
+    raw = orjson.dumps(
+        {"owner": owner, "repo": repo_name, "activity_summary": activity_summary},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.md5(raw).hexdigest()
 
 def create_analysis_prompt(owner: str, repo_name: str, activity_summary: str) -> str:
     return f"""Ты - эксперт-аналитик Open Source проектов. Проанализируй данные репозитория {owner}/{repo_name}:
@@ -126,9 +174,8 @@ def create_analysis_prompt(owner: str, repo_name: str, activity_summary: str) ->
 }}
 """
 
-def call_mistral_api(prompt: str) -> str:
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {MISTRAL_API_KEY}"}
-    payload = {
+def build_mistral_payload(prompt: str) -> Dict[str, Any]:
+    return {
         "model": MISTRAL_MODEL,
         "messages": [
             {"role": "system", "content": "You are a specialized JSON generator. Never include prose outside the JSON object."},
@@ -137,9 +184,11 @@ def call_mistral_api(prompt: str) -> str:
         "temperature": 0.2, # Снижаем для минимизации галлюцинаций в структуре
         "response_format": {"type": "json_object"} # Mistral поддерживает принудительный JSON режим
     }
-    response = requests.post(MISTRAL_API_URL, headers=headers, json=payload, timeout=110)
+
+async def call_mistral_api(prompt: str) -> str:
+    response = await app.state.http.post(MISTRAL_API_URL, json=build_mistral_payload(prompt))
     response.raise_for_status()
-    return response.json()['choices'][0]['message']['content']
+    return orjson.loads(response.content)['choices'][0]['message']['content']
 
 def parse_ai_response(text: str) -> Dict[str, Any]:
     # Дефолтная структура на случай сбоя
@@ -151,16 +200,19 @@ def parse_ai_response(text: str) -> Dict[str, Any]:
     }
     
     try:
-        # 1. Очистка от markdown блоков
-        clean_text = re.sub(r'```json|```', '', text).strip()
-        
-        # 2. Поиск JSON объекта
-        match = re.search(r'\{.*\}', clean_text, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-            data = json.loads(json_str)
+        # 1. Поиск JSON объекта (markdown-обертки остаются за его границами)
+        json_str = extract_json_object(text)
+        if json_str:
+            data = orjson.loads(json_str)
             
-            # 3. Гарантируем наличие вложенных структур для фронтенда
+            # 2. Гарантируем наличие полей и вложенных структур для фронтенда
+            if "analysis" not in data:
+                data["analysis"] = data.get("detailed_analysis", "")
+            if "summary" not in data:
+                data["summary"] = default_res["summary"]
+            # Модель иногда возвращает разделы объектом или списком - шлюз ждет строки
+            data["analysis"] = as_text(data["analysis"])
+            data["summary"] = as_text(data["summary"])
             if "insights" not in data or not isinstance(data["insights"], dict):
                 data["insights"] = default_res["insights"]
             if "recommendations" not in data or not isinstance(data["recommendations"], list):
@@ -173,6 +225,49 @@ def parse_ai_response(text: str) -> Dict[str, Any]:
         logger.error(f"Critical Parsing Error: {e}")
         return default_res
 
+def as_text(value: Any) -> str:
+    """Текстовое поле ответа модели: вложенные объекты и списки разворачиваются в абзацы"""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return "\n\n".join(f"{key}: {as_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return "\n".join(as_text(item) for item in value)
+    return str(value)
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Первый сбалансированный JSON-объект в тексте за один линейный проход:
+    считаем глубину фигурных скобок, пропуская строки и экранированные символы
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
 def generate_fallback_analysis(data: Dict[str, Any]) -> str:
     return f"Проект {data.get('repo_name')} показывает индекс активности {data.get('activity_index', 0)}%."
 
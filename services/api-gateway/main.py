@@ -3,14 +3,22 @@ API Gateway - центральная точка входа для всех за
 Port: 8000
 """
 import os
+import re
+import asyncio
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import requests
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+import httpx
+import orjson
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,10 +27,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Общий пул соединений к микросервисам на все время жизни шлюза"""
+    # HTTP/2 согласуется через ALPN, когда сервисы за TLS-прокси; иначе остается HTTP/1.1 keep-alive
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=40),
+        timeout=httpx.Timeout(60.0)
+    )
+    yield
+    await app.state.http.aclose()
+
+
 app = FastAPI(
     title="API Gateway",
     version="1.0.0",
-    description="Central API Gateway for GitHub Analytics Microservices"
+    description="Central API Gateway for GitHub Analytics Microservices",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS
@@ -43,77 +67,240 @@ logger.info(f"GitHub Service: {GITHUB_SERVICE_URL}")
 logger.info(f"Analytics Service: {ANALYTICS_SERVICE_URL}")
 logger.info(f"Database Service: {DATABASE_SERVICE_URL}")
 
+# Неизменяемые адреса эндпоинтов собираются один раз при старте
+_HEALTH_URLS = {
+    'github_service': f"{GITHUB_SERVICE_URL}/health",
+    'analytics_service': f"{ANALYTICS_SERVICE_URL}/health",
+    'database_service': f"{DATABASE_SERVICE_URL}/health"
+}
+_GITHUB_ANALYZE_URL = f"{GITHUB_SERVICE_URL}/analyze"
+_ANALYTICS_ANALYZE_URL = f"{ANALYTICS_SERVICE_URL}/analyze"
+_SAVE_URL = f"{DATABASE_SERVICE_URL}/stats/save"
+_HISTORY_URL = f"{DATABASE_SERVICE_URL}/stats/history"
+
+# Таймауты по типу вызова: проверки здоровья должны падать быстро, AI-анализу нужен запас
+HTTP_TIMEOUTS: Dict[str, httpx.Timeout] = {
+    'health': httpx.Timeout(3.0),
+    'github': httpx.Timeout(60.0, connect=5.0),
+    'analytics': httpx.Timeout(180.0, connect=5.0),
+    'database': httpx.Timeout(10.0),
+}
+
+# Кэш результатов проверки здоровья: частый опрос дашбордом не множит нагрузку на сервисы
+HEALTH_TTL = 5.0
+_HEALTH_CACHE: Dict[str, Tuple[float, Tuple[str, Optional[Dict], Optional[str]]]] = {}
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для одного сервиса: после failure_threshold ошибок подряд
+    запросы сразу отклоняются, через reset_timeout пропускается пробный запрос
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_count = 0
+        self.opened_at: Optional[float] = None
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+    
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # Пропускаем один пробный запрос, остальные ждут следующего окна
+            self.opened_at = time.monotonic()
+        return state != "open"
+    
+    def record_success(self):
+        self.failure_count = 0
+        self.opened_at = None
+    
+    def record_failure(self):
+        self.failure_count += 1
+        if self.failure_count >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened after {self.failure_count} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+# Предохранители по адресу сервиса (host:port)
+_BREAKERS: Dict[str, CircuitBreaker] = defaultdict(CircuitBreaker)
+
+
+# Максимальный период анализа в днях (самый длинный вариант в клиентах - год)
+MAX_PERIOD_DAYS = 365
+
 
 class AnalysisRequest(BaseModel):
+    """
+    Период задается либо явными датами (start_date/end_date),
+    либо числом дней (period_days) - тогда даты считаются по часам шлюза
+    """
+    model_config = ConfigDict(extra='forbid')
+    
     owner: str
     repo_name: str
-    start_date: str
-    end_date: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    period_days: Optional[int] = Field(default=None, gt=0, le=MAX_PERIOD_DAYS)
+
+    @model_validator(mode="after")
+    def resolve_period(self):
+        if self.period_days is not None:
+            end_date = datetime.utcnow()
+            self.start_date = (end_date - timedelta(days=self.period_days)).isoformat() + "Z"
+            self.end_date = end_date.isoformat() + "Z"
+        elif not (self.start_date and self.end_date):
+            raise ValueError("Either period_days or start_date and end_date must be provided")
+        return self
+
+
+class AnalyzeResponse(BaseModel):
+    """Ответ /api/analyze: данные GitHub Service + результат AI-анализа"""
+    success: bool
+    repo_info: Optional[Dict[str, Any]] = None
+    commit_stats: Optional[Dict[str, Any]] = None
+    contributors: Optional[List[Dict[str, Any]]] = None
+    total_contributors: Optional[int] = None
+    issue_stats: Optional[Dict[str, Any]] = None
+    pr_stats: Optional[Dict[str, Any]] = None
+    language_stats: Optional[Dict[str, Any]] = None
+    analysis_period_days: Optional[int] = None
+    activity_index: Optional[float] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    ai_analysis: str = ""
+    ai_recommendations: List[Any] = Field(default_factory=list)
+    ai_insights: Dict[str, Any] = Field(default_factory=dict)
+    ai_summary: str = ""
+    database_record_id: Optional[int] = None
+
+
+class BatchItem(BaseModel):
+    """Один подзапрос пакета: путь шлюза, например /api/history?limit=5"""
+    method: str = "GET"
+    path: str
+
 
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., max_length=20)
 
-def call_service(url: str, method: str = "GET", json_data: Dict = None, params: Dict = None) -> Dict:
-    """Универсальный вызов микросервиса"""
+
+async def call_service(
+    client: httpx.AsyncClient,
+    url: str,
+    method: str = "GET",
+    json_data: Dict = None,
+    params: Dict = None,
+    timeout_key: Optional[str] = None
+) -> Dict:
+    """Универсальный вызов микросервиса (timeout_key - ключ HTTP_TIMEOUTS)"""
+    breaker = _BREAKERS[urlsplit(url).netloc]
+    if not breaker.allow_request():
+        raise HTTPException(status_code=503, detail=f"Service temporarily unavailable (circuit open): {url}")
+    
+    timeout = HTTP_TIMEOUTS[timeout_key] if timeout_key else httpx.USE_CLIENT_DEFAULT
     try:
-        if method == "GET":
-            response = requests.get(url, params=params, timeout=60)
-        elif method == "POST":
-            response = requests.post(url, json=json_data, timeout=60)
-        else:
-            raise ValueError(f"Unsupported method: {method}")
+        response = await client.request(method, url, json=json_data, params=params, timeout=timeout)
         
         # Обработка 404: если сервис вернул "не найдено", пробрасываем это как контролируемую ошибку
         if response.status_code == 404:
+            breaker.record_success()
             raise HTTPException(status_code=404, detail=f"Resource not found at {url}")
-            
+        
+        # Сервис перегружен и просит повторить позже: передаем клиенту 429 как есть
+        if response.status_code == 429:
+            breaker.record_success()
+            retry_after = response.headers.get("Retry-After")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Service busy, retry later: {url}",
+                headers={"Retry-After": retry_after} if retry_after else None
+            )
+        
         response.raise_for_status()
+        breaker.record_success()
         return response.json()
     
     except HTTPException:
         raise
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
+        breaker.record_failure()
         logger.error(f"Timeout calling {url}")
         raise HTTPException(status_code=504, detail=f"Service timeout: {url}")
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
+        # 4xx - ошибка запроса, а не сервиса: на состояние предохранителя не влияет
+        if not (isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500):
+            breaker.record_failure()
         logger.error(f"Error calling {url}: {e}")
         raise HTTPException(status_code=502, detail=f"Service unavailable: {url}")
 
 
+# Время последнего форматирования и строка: отметка обновляется не чаще раза в 100 мс
+_LAST_TS = [0.0, ""]
+
+
+def _iso_ts() -> str:
+    """Текущее время UTC в ISO-формате для частых ответов о состоянии"""
+    now = time.time()
+    if now - _LAST_TS[0] > 0.1:
+        _LAST_TS[0] = now
+        _LAST_TS[1] = datetime.utcfromtimestamp(now).isoformat()
+    return _LAST_TS[1]
+
+
+async def probe_service(client: httpx.AsyncClient, name: str, url: str) -> Tuple[str, Optional[Dict], Optional[str]]:
+    """Проверка /health одного сервиса: (имя, ответ, текст ошибки), результат кэшируется на HEALTH_TTL"""
+    cached = _HEALTH_CACHE.get(name)
+    if cached and time.monotonic() - cached[0] < HEALTH_TTL:
+        return cached[1]
+
+    try:
+        result = name, await call_service(client, url, timeout_key='health'), None
+    except Exception as e:
+        result = name, None, str(e)
+
+    _HEALTH_CACHE[name] = (time.monotonic(), result)
+    return result
+
+
+async def probe_all_services(client: httpx.AsyncClient) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Параллельная проверка всех сервисов: задержка равна самому медленному, а не сумме"""
+    return await asyncio.gather(*(probe_service(client, name, url) for name, url in _HEALTH_URLS.items()))
+
+
 @app.get("/health")
 async def health_check():
     """Проверка здоровья API Gateway и всех сервисов"""
-    services_status = {}
-    
-    # Проверка GitHub Service
-    try:
-        github_health = call_service(f"{GITHUB_SERVICE_URL}/health")
-        services_status['github_service'] = 'healthy'
-    except:
-        services_status['github_service'] = 'unhealthy'
-    
-    # Проверка Analytics Service
-    try:
-        analytics_health = call_service(f"{ANALYTICS_SERVICE_URL}/health")
-        services_status['analytics_service'] = 'healthy'
-    except:
-        services_status['analytics_service'] = 'unhealthy'
-    
-    # Проверка Database Service
-    try:
-        database_health = call_service(f"{DATABASE_SERVICE_URL}/health")
-        services_status['database_service'] = 'healthy'
-    except:
-        services_status['database_service'] = 'unhealthy'
+    services_status = {
+        name: 'healthy' if error is None else 'unhealthy'
+        for name, _, error in await probe_all_services(app.state.http)
+    }
     
     all_healthy = all(status == 'healthy' for status in services_status.values())
     
     return {
         "status": "healthy" if all_healthy else "degraded",
         "service": "api-gateway",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": _iso_ts(),
         "services": services_status
     }
 
 
+@app.delete("/health/cache")
+async def clear_health_cache():
+    """Сброс кэша проверок здоровья"""
+    _HEALTH_CACHE.clear()
+    return {"success": True}
+
+
 @app.get("/api/repo/{owner}/{repo_name}")
 async def get_repo_info(owner: str, repo_name: str):
     """
@@ -123,7 +310,11 @@ async def get_repo_info(owner: str, repo_name: str):
     
     try:
         # Запрос к GitHub Service
-        repo_data = call_service(f"{GITHUB_SERVICE_URL}/repo/{owner}/{repo_name}")
+        repo_data = await call_service(
+            app.state.http,
+            f"{GITHUB_SERVICE_URL}/repo/{owner}/{repo_name}",
+            timeout_key='github'
+        )
         
         return repo_data
     
@@ -135,88 +326,155 @@ async def get_repo_info(owner: str, repo_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/analyze")
-async def analyze_repository(request: AnalysisRequest):
+async def fetch_github_activity(request: AnalysisRequest) -> Dict[str, Any]:
+    """Шаг 1: данные активности репозитория от GitHub Service"""
+    github_response = await call_service(
+        app.state.http,
+        _GITHUB_ANALYZE_URL,
+        method="POST",
+        json_data={
+            "owner": request.owner,
+            "repo_name": request.repo_name,
+            "start_date": request.start_date,
+            "end_date": request.end_date
+        },
+        timeout_key='github'
+    )
+    
+    # Если сервис вернул успех: False (но 200 OK), считаем это ошибкой данных
+    if not github_response.get('success'):
+        raise HTTPException(status_code=404, detail="GitHub data not found or analysis failed")
+    
+    return github_response
+
+
+async def request_ai_analysis(request: AnalysisRequest, activity_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Шаг 2: AI-анализ в Analytics Service"""
+    return await call_service(
+        app.state.http,
+        _ANALYTICS_ANALYZE_URL,
+        method="POST",
+        json_data={
+            "repo_name": request.repo_name,
+            "owner": request.owner,
+            "activity_data": activity_data
+        },
+        timeout_key='analytics'
+    )
+
+
+async def save_statistics(
+    request: AnalysisRequest,
+    activity_data: Dict[str, Any],
+    analytics_response: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Шаг 3: сохранение статистики в Database Service (только после ответа Analytics Service)"""
+    commit_stats = activity_data.get('commit_stats', {})
+    return await call_service(
+        app.state.http,
+        _SAVE_URL,
+        method="POST",
+        json_data={
+            "owner": request.owner,
+            "repo_name": request.repo_name,
+            "total_commits": commit_stats.get('total_commits', 0),
+            "total_contributors": activity_data.get('total_contributors', 0),
+            "avg_commits_per_day": commit_stats.get('average_commits_per_day', 0),
+            "analysis_period_days": activity_data.get('analysis_period_days', 0),
+            "activity_index": activity_data.get('activity_index', 0),
+            "additional_data": {
+                "ai_analysis_available": bool(analytics_response.get('success'))
+            }
+        },
+        timeout_key='database'
+    )
+
+
+def build_analyze_result(
+    request: AnalysisRequest,
+    activity_data: Dict[str, Any],
+    analytics_response: Dict[str, Any],
+    save_response: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Шаг 4: формирование полного ответа"""
+    return {
+        "success": True,
+        "repo_info": activity_data.get('repo_info'),
+        "commit_stats": activity_data.get('commit_stats'),
+        "contributors": activity_data.get('contributors'),
+        "total_contributors": activity_data.get('total_contributors'),
+        "issue_stats": activity_data.get('issue_stats'),
+        "pr_stats": activity_data.get('pr_stats'),
+        "language_stats": activity_data.get('language_stats'),
+        "analysis_period_days": activity_data.get('analysis_period_days'),
+        "activity_index": activity_data.get('activity_index'),
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "ai_analysis": analytics_response.get('analysis', ''),
+        "ai_recommendations": analytics_response.get('recommendations', []),
+        "ai_insights": analytics_response.get('insights', {}),
+        "ai_summary": analytics_response.get('summary', ''),
+        "database_record_id": save_response.get('record_id')
+    }
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Одно событие Server-Sent Events"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+async def analyze_events(request: AnalysisRequest):
+    """События анализа по мере готовности шагов: github, analytics, database, result (или error)"""
+    try:
+        activity_data = await fetch_github_activity(request)
+        yield sse_event("github", activity_data)
+        
+        analytics_response = await request_ai_analysis(request, activity_data)
+        yield sse_event("analytics", analytics_response)
+        
+        save_response = await save_statistics(request, activity_data, analytics_response)
+        yield sse_event("database", save_response)
+        
+        yield sse_event("result", build_analyze_result(request, activity_data, analytics_response, save_response))
+        
+        logger.info(f"API Gateway: Streamed analysis completed for {request.owner}/{request.repo_name}")
+    
+    except HTTPException as e:
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        logger.error(f"Error in analyze_events: {e}", exc_info=True)
+        yield sse_event("error", {"status_code": 500, "detail": str(e)})
+
+
+@app.post("/api/analyze", response_model=AnalyzeResponse)
+async def analyze_repository(request: AnalysisRequest, stream: bool = False):
     """
-    Полный анализ репозитория с AI-аналитикой
+    Полный анализ репозитория с AI-аналитикой.
+    С stream=true результаты шагов отдаются как Server-Sent Events
     """
     logger.info(f"API Gateway: Starting full analysis for {request.owner}/{request.repo_name}")
     
+    if stream:
+        return StreamingResponse(
+            analyze_events(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
     try:
-        # Шаг 1: Получение данных от GitHub Service
         logger.info("Step 1: Fetching GitHub data...")
-        github_response = call_service(
-            f"{GITHUB_SERVICE_URL}/analyze",
-            method="POST",
-            json_data={
-                "owner": request.owner,
-                "repo_name": request.repo_name,
-                "start_date": request.start_date,
-                "end_date": request.end_date
-            }
-        )
-        
-        # Если сервис вернул успех: False (но 200 OK), считаем это ошибкой данных
-        if not github_response.get('success'):
-            raise HTTPException(status_code=404, detail="GitHub data not found or analysis failed")
+        activity_data = await fetch_github_activity(request)
         
-        activity_data = github_response
-        
-        # Шаг 2: AI-анализ через Analytics Service
         logger.info("Step 2: Generating AI analysis...")
-        analytics_response = call_service(
-            f"{ANALYTICS_SERVICE_URL}/analyze",
-            method="POST",
-            json_data={
-                "repo_name": request.repo_name,
-                "owner": request.owner,
-                "activity_data": activity_data
-            }
-        )
+        analytics_response = await request_ai_analysis(request, activity_data)
         
-        # Шаг 3: Сохранение в Database Service
+        # Запись сохраняется только после ответа Analytics Service: при его ошибке
+        # в истории не появляется анализ, о котором клиенту сообщили как о неудачном
         logger.info("Step 3: Saving to database...")
-        commit_stats = activity_data.get('commit_stats', {})
-        
-        save_response = call_service(
-            f"{DATABASE_SERVICE_URL}/stats/save",
-            method="POST",
-            json_data={
-                "owner": request.owner,
-                "repo_name": request.repo_name,
-                "total_commits": commit_stats.get('total_commits', 0),
-                "total_contributors": activity_data.get('total_contributors', 0),
-                "avg_commits_per_day": commit_stats.get('average_commits_per_day', 0),
-                "analysis_period_days": activity_data.get('analysis_period_days', 0),
-                "activity_index": activity_data.get('activity_index', 0),
-                "additional_data": {
-                    "ai_analysis_available": analytics_response.get('success', False)
-                }
-            }
-        )
+        save_response = await save_statistics(request, activity_data, analytics_response)
         
-        # Шаг 4: Формирование полного ответа
         logger.info("Step 4: Preparing response...")
-        
-        result = {
-            "success": True,
-            "repo_info": activity_data.get('repo_info'),
-            "commit_stats": activity_data.get('commit_stats'),
-            "contributors": activity_data.get('contributors'),
-            "total_contributors": activity_data.get('total_contributors'),
-            "issue_stats": activity_data.get('issue_stats'),
-            "pr_stats": activity_data.get('pr_stats'),
-            "language_stats": activity_data.get('language_stats'),
-            "analysis_period_days": activity_data.get('analysis_period_days'),
-            "activity_index": activity_data.get('activity_index'),
-            "start_date": request.start_date,
-            "end_date": request.end_date,
-            "ai_analysis": analytics_response.get('analysis', ''),
-            "ai_recommendations": analytics_response.get('recommendations', []),
-            "ai_insights": analytics_response.get('insights', {}),
-            "ai_summary": analytics_response.get('summary', ''),
-            "database_record_id": save_response.get('record_id')
-        }
+        result = build_analyze_result(request, activity_data, analytics_response, save_response)
         
         logger.info(f"API Gateway: Analysis completed for {request.owner}/{request.repo_name}")
         
@@ -237,9 +495,11 @@ async def get_history(limit: int = 50, offset: int = 0):
     logger.info(f"API Gateway: Getting history (limit={limit}, offset={offset})")
     
     try:
-        history_data = call_service(
-            f"{DATABASE_SERVICE_URL}/stats/history",
-            params={"limit": limit, "offset": offset}
+        history_data = await call_service(
+            app.state.http,
+            _HISTORY_URL,
+            params={"limit": limit, "offset": offset},
+            timeout_key='database'
         )
         
         return history_data
@@ -259,9 +519,11 @@ async def get_repo_history(owner: str, repo_name: str, limit: int = 10):
     logger.info(f"API Gateway: Getting history for {owner}/{repo_name}")
     
     try:
-        history_data = call_service(
+        history_data = await call_service(
+            app.state.http,
             f"{DATABASE_SERVICE_URL}/stats/repo/{owner}/{repo_name}",
-            params={"limit": limit}
+            params={"limit": limit},
+            timeout_key='database'
         )
         
         return history_data
@@ -280,31 +542,73 @@ async def get_services_status():
     """
     status = {}
     
-    services = {
-        'github_service': f"{GITHUB_SERVICE_URL}/health",
-        'analytics_service': f"{ANALYTICS_SERVICE_URL}/health",
-        'database_service': f"{DATABASE_SERVICE_URL}/health"
-    }
-    
-    for service_name, url in services.items():
-        try:
-            response = call_service(url)
+    for service_name, response, error in await probe_all_services(app.state.http):
+        if error is None:
             status[service_name] = {
                 'status': 'online',
                 'details': response
             }
-        except Exception as e:
+        else:
             status[service_name] = {
                 'status': 'offline',
-                'error': str(e)
+                'error': error
             }
     
     return {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": _iso_ts(),
         "services": status
     }
 
 
+# Маршруты, доступные в /api/batch: (метод, шаблон пути, вызов обработчика по параметрам пути и query).
+# Только дешевые чтения: /api/analyze запускает анализ GitHub + AI и в пакет не входит
+BATCH_ROUTES = [
+    ("GET", re.compile(r"/health"), lambda path, query: health_check()),
+    ("GET", re.compile(r"/api/services/status"), lambda path, query: get_services_status()),
+    ("GET", re.compile(r"/api/repo/(?P<owner>[^/]+)/(?P<repo_name>[^/]+)"),
+     lambda path, query: get_repo_info(**path)),
+    ("GET", re.compile(r"/api/history"),
+     lambda path, query: get_history(int(query.get('limit', 50)), int(query.get('offset', 0)))),
+    ("GET", re.compile(r"/api/history/(?P<owner>[^/]+)/(?P<repo_name>[^/]+)"),
+     lambda path, query: get_repo_history(**path, limit=int(query.get('limit', 10)))),
+]
+
+
+async def dispatch_batch_item(item: BatchItem) -> Dict[str, Any]:
+    """Выполнить подзапрос прямым вызовом обработчика; ошибка не влияет на остальные"""
+    url = urlsplit(item.path)
+    method = item.method.upper()
+    
+    for route_method, pattern, handler in BATCH_ROUTES:
+        match = pattern.fullmatch(url.path)
+        if route_method == method and match:
+            break
+    else:
+        return {"path": item.path, "status": 404, "error": "Route not available in batch"}
+    
+    try:
+        result = await handler(match.groupdict(), dict(parse_qsl(url.query)))
+        return {"path": item.path, "status": 200, "body": result}
+    except HTTPException as e:
+        return {"path": item.path, "status": e.status_code, "error": e.detail}
+    except ValueError as e:
+        return {"path": item.path, "status": 422, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error in batch item {item.path}: {e}")
+        return {"path": item.path, "status": 500, "error": str(e)}
+
+
+@app.post("/api/batch")
+async def batch(request: BatchRequest):
+    """
+    Несколько запросов к шлюзу за один HTTP-вызов, подзапросы выполняются параллельно
+    """
+    logger.info(f"API Gateway: Batch of {len(request.requests)} requests")
+    
+    responses = await asyncio.gather(*(dispatch_batch_item(item) for item in request.requests))
+    return {"responses": responses}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Тесты API Gateway: pytest services/api-gateway
+"""
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import main
+from main import AnalysisRequest
+
+
+def test_period_days_sets_dates():
+    request = AnalysisRequest(owner="octocat", repo_name="hello-world", period_days=30)
+    start_date = datetime.fromisoformat(request.start_date)
+    end_date = datetime.fromisoformat(request.end_date)
+    assert (end_date - start_date).days == 30
+
+
+@pytest.mark.parametrize("period_days", [0, -5])
+def test_non_positive_period_days_rejected(period_days):
+    # 0 не должен молча переходить к ветке с явными датами, отрицательный - давать start_date > end_date
+    with pytest.raises(ValidationError):
+        AnalysisRequest(
+            owner="octocat",
+            repo_name="hello-world",
+            start_date="2024-01-01T00:00:00Z",
+            end_date="2024-01-31T00:00:00Z",
+            period_days=period_days
+        )
+
+
+ANALYZE_BODY = {"owner": "octocat", "repo_name": "hello-world", "period_days": 30}
+
+
+@pytest.fixture
+def service_calls(monkeypatch):
+    """Подменяет вызовы микросервисов: URL -> ответ или исключение, вызовы записываются"""
+    responses = {
+        main._GITHUB_ANALYZE_URL: {"success": True, "commit_stats": {"total_commits": 3}},
+        main._ANALYTICS_ANALYZE_URL: {"success": True, "analysis": "ok", "summary": "ok"},
+        main._SAVE_URL: {"success": True, "record_id": 1},
+    }
+    calls = []
+    
+    async def fake_call_service(client, url, method="GET", json_data=None, params=None, timeout_key=None):
+        calls.append((url, json_data))
+        response = responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+    
+    monkeypatch.setattr(main, "call_service", fake_call_service)
+    return responses, calls
+
+
+def test_analyze_saves_after_analytics(service_calls):
+    _, calls = service_calls
+    with TestClient(main.app) as client:
+        response = client.post("/api/analyze", json=ANALYZE_BODY)
+    
+    assert response.status_code == 200
+    assert response.json()["database_record_id"] == 1
+    assert [url for url, _ in calls] == [main._GITHUB_ANALYZE_URL, main._ANALYTICS_ANALYZE_URL, main._SAVE_URL]
+    assert calls[-1][1]["additional_data"] == {"ai_analysis_available": True}
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_analytics_failure_does_not_save(service_calls, stream):
+    responses, calls = service_calls
+    responses[main._ANALYTICS_ANALYZE_URL] = HTTPException(status_code=504, detail="Service timeout")
+    
+    with TestClient(main.app) as client:
+        response = client.post("/api/analyze", params={"stream": stream}, json=ANALYZE_BODY)
+    
+    if stream:
+        assert "event: error" in response.text
+    else:
+        assert response.status_code == 504
+    assert main._SAVE_URL not in [url for url, _ in calls]
+
+
+def test_busy_service_passes_429_without_opening_breaker():
+    # github-service отвечает 429, когда все слоты анализа заняты
+    transport = httpx.MockTransport(lambda request: httpx.Response(429, headers={"Retry-After": "10"}))
+    url = "http://busy-service:8001/analyze"
+    
+    async def call_repeatedly():
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(main.CircuitBreaker().failure_threshold + 1):
+                with pytest.raises(HTTPException) as exc_info:
+                    await main.call_service(client, url, method="POST")
+                assert exc_info.value.status_code == 429
+                assert exc_info.value.headers == {"Retry-After": "10"}
+    
+    asyncio.run(call_repeatedly())
+    assert main._BREAKERS["busy-service:8001"].allow_request()
@@ -3,15 +3,21 @@ Database Service - управление базой данных
 Port: 8003
 """
 import os
+import asyncio
+import time
+import queue
 import sqlite3
 import logging
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+import orjson
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,7 +26,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Database Service", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Блокирующие вызовы sqlite3 выполняются в пуле потоков, а не в цикле событий"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+    )
+    prune_task = asyncio.create_task(prune_cache_loop())
+    yield
+    prune_task.cancel()
+
+
+app = FastAPI(
+    title="Database Service",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # CORS
 app.add_middleware(
@@ -33,9 +56,22 @@ app.add_middleware(
 
 # Конфигурация
 DATABASE_PATH = os.getenv('DATABASE_PATH', './data/github_statistics.db')
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '8'))
+CACHE_PRUNE_INTERVAL = int(os.getenv('CACHE_PRUNE_INTERVAL', '60'))
+
+# Настройки соединения: WAL (journal_mode) хранится в файле БД и включается один раз
+# при инициализации, остальные PRAGMA действуют только на текущее соединение
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
 
 
 class StatsSaveRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+    
     owner: str
     repo_name: str
     total_commits: int
@@ -46,23 +82,86 @@ class StatsSaveRequest(BaseModel):
     additional_data: Optional[Dict[str, Any]] = None
 
 
+class HistoryItem(BaseModel):
+    id: int
+    owner: str
+    repo_name: str
+    total_commits: Optional[int] = None
+    total_contributors: Optional[int] = None
+    avg_commits_per_day: Optional[float] = None
+    analysis_period_days: Optional[int] = None
+    activity_index: Optional[float] = None
+    timestamp: Optional[str] = None
+
+
+class HistoryResponse(BaseModel):
+    history: List[HistoryItem]
+    total: int
+    limit: int
+    offset: int
+
+
+# Запись статистики: повтор анализа с тем же периодом за тот же день обновляет прежнюю
+# запись (idx_unique_daily_period) и сохраняет ее id - на него ссылаются уже выданные ответы
+INSERT_STATS_SQL = '''
+    INSERT INTO repo_stats 
+    (owner, repo_name, total_commits, total_contributors, 
+     avg_commits_per_day, analysis_period_days, activity_index, additional_data)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(owner, repo_name, analysis_period_days, date(timestamp)) DO UPDATE SET
+        total_commits = excluded.total_commits,
+        total_contributors = excluded.total_contributors,
+        avg_commits_per_day = excluded.avg_commits_per_day,
+        activity_index = excluded.activity_index,
+        additional_data = excluded.additional_data,
+        timestamp = CURRENT_TIMESTAMP
+'''
+
+# Колонки repo_stats, которые отдаются в истории (additional_data не нужен)
+HISTORY_COLUMNS = (
+    "id, owner, repo_name, total_commits, total_contributors, "
+    "avg_commits_per_day, analysis_period_days, activity_index, timestamp"
+)
+
+# Пул открытых соединений, заполняется в initialize_database
+_POOL: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+
+
+def open_db_connection() -> sqlite3.Connection:
+    """Открыть и настроить новое соединение для пула"""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 @contextmanager
 def get_db_connection():
-    """Контекстный менеджер для подключения к БД"""
-    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Контекстный менеджер: взять соединение из пула и вернуть его после работы"""
+    conn = _POOL.get()
     try:
         yield conn
+    except Exception:
+        # Незавершенная транзакция не должна достаться следующему запросу
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        _POOL.put(conn)
 
 
 def initialize_database():
-    """Инициализация базы данных"""
+    """Инициализация базы данных и пула соединений"""
+    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+    for _ in range(DATABASE_POOL_SIZE):
+        _POOL.put(open_db_connection())
+    
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
+        # WAL: чтение истории не блокируется записью статистики
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Основная таблица статистики
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS repo_stats (
@@ -75,7 +174,7 @@ def initialize_database():
                 analysis_period_days INTEGER,
                 activity_index REAL DEFAULT 0.0,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                additional_data TEXT
+                additional_data BLOB
             )
         ''')
         
@@ -86,16 +185,40 @@ def initialize_database():
                 cache_key TEXT UNIQUE NOT NULL,
                 data TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP
+                expires_at INTEGER
             )
         ''')
         
+        # Раньше expires_at хранился ISO-строкой: такие записи не сравниваются с epoch
+        cursor.execute("DELETE FROM github_cache WHERE typeof(expires_at) != 'integer'")
+        
         # Индексы
+        # Покрывающий индекс для истории репозитория; idx_owner_repo - его префикс
+        cursor.execute('DROP INDEX IF EXISTS idx_owner_repo')
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_owner_repo 
-            ON repo_stats(owner, repo_name)
+            CREATE INDEX IF NOT EXISTS idx_owner_repo_ts 
+            ON repo_stats(owner, repo_name, timestamp DESC, id)
         ''')
         
+        # Одна запись на репозиторий и период анализа в день: повторный анализ обновляет прежний.
+        # Перед созданием индекса схлопываем уже накопленные дубликаты
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_unique_daily_period'"
+        )
+        if not cursor.fetchone():
+            # Прежний индекс не учитывал период анализа
+            cursor.execute('DROP INDEX IF EXISTS idx_unique_daily')
+            cursor.execute('''
+                DELETE FROM repo_stats WHERE id NOT IN (
+                    SELECT MAX(id) FROM repo_stats
+                    GROUP BY owner, repo_name, analysis_period_days, date(timestamp)
+                )
+            ''')
+            cursor.execute('''
+                CREATE UNIQUE INDEX idx_unique_daily_period 
+                ON repo_stats(owner, repo_name, analysis_period_days, date(timestamp))
+            ''')
+        
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_timestamp 
             ON repo_stats(timestamp DESC)
@@ -106,14 +229,43 @@ def initialize_database():
             ON github_cache(cache_key)
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cache_expires 
+            ON github_cache(expires_at)
+        ''')
+        
         conn.commit()
-        logger.info(f"Database initialized at {DATABASE_PATH}")
+        logger.info(f"Database initialized at {DATABASE_PATH} (pool size: {DATABASE_POOL_SIZE})")
 
 
 # Инициализация при старте
 initialize_database()
 
 
+def prune_expired_cache() -> int:
+    """Удалить все истекшие записи кеша одним запросом"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'DELETE FROM github_cache WHERE expires_at <= ?',
+            (int(time.time()),)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+async def prune_cache_loop():
+    """Фоновая очистка кеша: чтение /cache/get не пишет в БД"""
+    while True:
+        await asyncio.sleep(CACHE_PRUNE_INTERVAL)
+        try:
+            deleted = await asyncio.to_thread(prune_expired_cache)
+            if deleted:
+                logger.info(f"Pruned {deleted} expired cache records")
+        except Exception as e:
+            logger.error(f"Error pruning cache: {e}")
+
+
 @app.get("/health")
 async def health_check():
     """Проверка здоровья сервиса"""
@@ -125,211 +277,233 @@ async def health_check():
     }
 
 
+def stats_params(request: StatsSaveRequest) -> tuple:
+    """Параметры INSERT_STATS_SQL для одной записи"""
+    additional_data_bytes = None
+    if request.additional_data:
+        additional_data_bytes = orjson.dumps(request.additional_data)
+    
+    return (
+        request.owner,
+        request.repo_name,
+        request.total_commits,
+        request.total_contributors,
+        request.avg_commits_per_day,
+        request.analysis_period_days,
+        request.activity_index,
+        additional_data_bytes
+    )
+
+
+def _do_save(request: StatsSaveRequest) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # lastrowid не меняется, если сработал DO UPDATE: id берется из RETURNING
+        cursor.execute(INSERT_STATS_SQL + ' RETURNING id', stats_params(request))
+        record_id = cursor.fetchone()[0]
+        
+        conn.commit()
+        
+        logger.info(f"Statistics saved: {request.owner}/{request.repo_name} (ID: {record_id})")
+        
+        return {
+            "success": True,
+            "record_id": record_id,
+            "message": "Statistics saved successfully"
+        }
+
+
 @app.post("/stats/save")
 async def save_statistics(request: StatsSaveRequest):
     """Сохранить статистику в БД"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            additional_data_str = None
-            if request.additional_data:
-                import json
-                additional_data_str = json.dumps(request.additional_data)
-            
-            cursor.execute('''
-                INSERT INTO repo_stats 
-                (owner, repo_name, total_commits, total_contributors, 
-                 avg_commits_per_day, analysis_period_days, activity_index, additional_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                request.owner,
-                request.repo_name,
-                request.total_commits,
-                request.total_contributors,
-                request.avg_commits_per_day,
-                request.analysis_period_days,
-                request.activity_index,
-                additional_data_str
-            ))
-            
-            conn.commit()
-            record_id = cursor.lastrowid
-            
-            logger.info(f"Statistics saved: {request.owner}/{request.repo_name} (ID: {record_id})")
-            
-            return {
-                "success": True,
-                "record_id": record_id,
-                "message": "Statistics saved successfully"
-            }
+        return await asyncio.to_thread(_do_save, request)
     
     except Exception as e:
         logger.error(f"Error saving statistics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/stats/history")
-async def get_history(limit: int = 50, offset: int = 0):
-    """Получить историю запросов"""
+def _do_save_batch(requests: List[StatsSaveRequest]) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Все записи в одной транзакции: один commit на пакет
+        cursor.executemany(INSERT_STATS_SQL, [stats_params(request) for request in requests])
+        conn.commit()
+        
+        logger.info(f"Statistics batch saved: {len(requests)} records")
+        
+        return {
+            "success": True,
+            "saved_records": len(requests),
+            "message": "Statistics saved successfully"
+        }
+
+
+@app.post("/stats/save/batch")
+async def save_statistics_batch(requests: List[StatsSaveRequest]):
+    """Сохранить несколько записей статистики одним запросом"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM repo_stats
-                ORDER BY timestamp DESC
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            
-            rows = cursor.fetchall()
-            
-            history = []
-            for row in rows:
-                history.append({
-                    "id": row["id"],
-                    "owner": row["owner"],
-                    "repo_name": row["repo_name"],
-                    "total_commits": row["total_commits"],
-                    "total_contributors": row["total_contributors"],
-                    "avg_commits_per_day": row["avg_commits_per_day"],
-                    "analysis_period_days": row["analysis_period_days"],
-                    "activity_index": row["activity_index"],
-                    "timestamp": row["timestamp"]
-                })
-            
-            # Подсчет общего количества записей
+        return await asyncio.to_thread(_do_save_batch, requests)
+    
+    except Exception as e:
+        logger.error(f"Error saving statistics batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _do_get_history(limit: int, offset: int) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Страница и общее количество записей одним запросом
+        cursor.execute(f'''
+            SELECT {HISTORY_COLUMNS}, COUNT(*) OVER () AS total_count
+            FROM repo_stats
+            ORDER BY timestamp DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset))
+        
+        history = [dict(row) for row in cursor.fetchall()]
+        if history:
+            total = history[0]["total_count"]
+            for item in history:
+                del item["total_count"]
+        elif offset:
+            # Страница за пределами данных: оконная функция ничего не вернула
             cursor.execute('SELECT COUNT(*) as count FROM repo_stats')
             total = cursor.fetchone()["count"]
-            
-            return {
-                "history": history,
-                "total": total,
-                "limit": limit,
-                "offset": offset
-            }
+        else:
+            total = 0
+        
+        return {
+            "history": history,
+            "total": total,
+            "limit": limit,
+            "offset": offset
+        }
+
+
+@app.get("/stats/history", response_model=HistoryResponse)
+async def get_history(limit: int = 50, offset: int = 0):
+    """Получить историю запросов"""
+    try:
+        return await asyncio.to_thread(_do_get_history, limit, offset)
     
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _do_get_repo_history(owner: str, repo_name: str, limit: int) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT {HISTORY_COLUMNS} FROM repo_stats
+            WHERE owner = ? AND repo_name = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        ''', (owner, repo_name, limit))
+        
+        history = [dict(row) for row in cursor.fetchall()]
+        
+        return {
+            "owner": owner,
+            "repo_name": repo_name,
+            "history": history,
+            "count": len(history)
+        }
+
+
 @app.get("/stats/repo/{owner}/{repo_name}")
 async def get_repo_history(owner: str, repo_name: str, limit: int = 10):
     """Получить историю для конкретного репозитория"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM repo_stats
-                WHERE owner = ? AND repo_name = ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (owner, repo_name, limit))
-            
-            rows = cursor.fetchall()
-            
-            history = []
-            for row in rows:
-                history.append({
-                    "id": row["id"],
-                    "owner": row["owner"],
-                    "repo_name": row["repo_name"],
-                    "total_commits": row["total_commits"],
-                    "total_contributors": row["total_contributors"],
-                    "avg_commits_per_day": row["avg_commits_per_day"],
-                    "analysis_period_days": row["analysis_period_days"],
-                    "activity_index": row["activity_index"],
-                    "timestamp": row["timestamp"]
-                })
-            
-            return {
-                "owner": owner,
-                "repo_name": repo_name,
-                "history": history,
-                "count": len(history)
-            }
+        return await asyncio.to_thread(_do_get_repo_history, owner, repo_name, limit)
     
     except Exception as e:
         logger.error(f"Error fetching repo history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _do_set_cache(cache_key: str, data: str, ttl_seconds: int) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        expires_at = int(time.time()) + ttl_seconds
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO github_cache (cache_key, data, expires_at)
+            VALUES (?, ?, ?)
+        ''', (cache_key, data, expires_at))
+        
+        conn.commit()
+        
+        return {"success": True, "cache_key": cache_key}
+
+
 @app.post("/cache/set")
 async def set_cache(cache_key: str, data: str, ttl_seconds: int = 3600):
     """Сохранить данные в кеш"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            expires_at = datetime.utcnow().timestamp() + ttl_seconds
-            expires_at_str = datetime.fromtimestamp(expires_at).isoformat()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO github_cache (cache_key, data, expires_at)
-                VALUES (?, ?, ?)
-            ''', (cache_key, data, expires_at_str))
-            
-            conn.commit()
-            
-            return {"success": True, "cache_key": cache_key}
+        return await asyncio.to_thread(_do_set_cache, cache_key, data, ttl_seconds)
     
     except Exception as e:
         logger.error(f"Error setting cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _do_get_cache(cache_key: str) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Истекшие записи отсекаются самим SQLite
+        cursor.execute('''
+            SELECT data FROM github_cache
+            WHERE cache_key = ? AND expires_at > ?
+        ''', (cache_key, int(time.time())))
+        
+        row = cursor.fetchone()
+        
+        if not row:
+            return {"found": False}
+        
+        return {
+            "found": True,
+            "data": row["data"],
+            "cache_key": cache_key
+        }
+
+
 @app.get("/cache/get/{cache_key}")
 async def get_cache(cache_key: str):
     """Получить данные из кеша"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT data, expires_at FROM github_cache
-                WHERE cache_key = ?
-            ''', (cache_key,))
-            
-            row = cursor.fetchone()
-            
-            if not row:
-                return {"found": False}
-            
-            # Проверка срока действия
-            expires_at = datetime.fromisoformat(row["expires_at"])
-            if expires_at < datetime.utcnow():
-                # Кеш истек
-                cursor.execute('DELETE FROM github_cache WHERE cache_key = ?', (cache_key,))
-                conn.commit()
-                return {"found": False, "expired": True}
-            
-            return {
-                "found": True,
-                "data": row["data"],
-                "cache_key": cache_key
-            }
+        return await asyncio.to_thread(_do_get_cache, cache_key)
     
     except Exception as e:
         logger.error(f"Error getting cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _do_clear_cache() -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM github_cache')
+        conn.commit()
+        deleted = cursor.rowcount
+        
+        return {
+            "success": True,
+            "deleted_records": deleted
+        }
+
+
 @app.delete("/cache/clear")
 async def clear_cache():
     """Очистить весь кеш"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM github_cache')
-            conn.commit()
-            deleted = cursor.rowcount
-            
-            return {
-                "success": True,
-                "deleted_records": deleted
-            }
+        return await asyncio.to_thread(_do_clear_cache)
     
     except Exception as e:
         logger.error(f"Error clearing cache: {e}")
@@ -3,15 +3,23 @@ GitHub Service - сбор данных из GitHub API
 Port: 8001
 """
 import os
+import re
+import time
+import asyncio
 import logging
-import requests
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter
+from itertools import chain
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from cachetools import LRUCache, TTLCache
+import httpx
+import orjson
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,24 +28,108 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="GitHub Service", version="1.0.0")
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Конфигурация
 GITHUB_API_URL = "https://api.github.com"
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN', '')
 
+# Повтор запросов при временных ошибках GitHub
+GITHUB_MAX_RETRIES = 3
+GITHUB_RETRY_BACKOFF = 0.3
+GITHUB_RETRY_STATUSES = {502, 503, 504}
+
+# Из истории коммитов нужны только автор и дата - в REST каждый коммит приходит целиком
+COMMIT_PAGE_FRAGMENT = """
+fragment CommitPage on CommitHistoryConnection {
+  nodes { author { name date } }
+  pageInfo { hasNextPage endCursor }
+}
+"""
+
+# Один GraphQL-запрос вместо пяти REST-вызовов (репозиторий, первая страница коммитов, issues, PR, языки).
+# Доступен только с токеном; контрибьюторы запрашиваются через REST
+GITHUB_GRAPHQL_QUERY = """
+query($owner: String!, $name: String!, $since: DateTime!, $commitsSince: GitTimestamp!) {
+  repository(owner: $owner, name: $name) {
+    nameWithOwner
+    name
+    owner { login }
+    description
+    primaryLanguage { name }
+    stargazerCount
+    forkCount
+    watchers { totalCount }
+    openIssues: issues(states: OPEN) { totalCount }
+    openPullRequests: pullRequests(states: OPEN) { totalCount }
+    diskUsage
+    defaultBranchRef {
+      name
+      target { ... on Commit { history(first: 100, since: $commitsSince) { ...CommitPage } } }
+    }
+    createdAt
+    updatedAt
+    pushedAt
+    url
+    repositoryTopics(first: 20) { nodes { topic { name } } }
+    hasIssuesEnabled
+    hasProjectsEnabled
+    hasWikiEnabled
+    issues(first: 100, filterBy: {since: $since}, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      nodes { state labels(first: 20) { nodes { name } } }
+    }
+    pullRequests(first: 100, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { state mergedAt }
+    }
+    languages(first: 100, orderBy: {field: SIZE, direction: DESC}) {
+      edges { size node { name } }
+    }
+  }
+}
+""" + COMMIT_PAGE_FRAGMENT
+
+# Следующие страницы истории коммитов (курсорная пагинация GraphQL)
+GITHUB_COMMITS_QUERY = """
+query($owner: String!, $name: String!, $commitsSince: GitTimestamp!, $cursor: String!) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef {
+      target { ... on Commit { history(first: 100, since: $commitsSince, after: $cursor) { ...CommitPage } } }
+    }
+  }
+}
+""" + COMMIT_PAGE_FRAGMENT
+
+# Максимум страниц коммитов (по 100) - защита от больших репозиториев
+COMMITS_MAX_PAGES = 10
+
+# Одновременные анализы: каждый держит десятки соединений и промежуточные данные в памяти.
+# Запрос, не дождавшийся слота за ANALYSIS_QUEUE_TIMEOUT секунд, получает 429 с Retry-After
+# (не 5xx: перегрузка - не отказ сервиса, предохранитель шлюза ее не учитывает)
+MAX_CONCURRENT_ANALYSES = int(os.getenv('MAX_CONCURRENT_ANALYSES', '8'))
+ANALYSIS_QUEUE_TIMEOUT = 2.0
+ANALYSIS_SEM = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+ANALYSIS_RETRY_AFTER = 10
+
+# Номер последней страницы из заголовка Link
+LAST_PAGE_RE = re.compile(r'<[^>]*[?&]page=(\d+)[^>]*>;\s*rel="last"')
+
+# Кэш ответов GitHub: (endpoint, params) -> (ETag, тело, Link).
+# Повторный запрос уходит с If-None-Match, ответ 304 не расходует лимит API
+ETAG_CACHE = TTLCache(maxsize=1024, ttl=300)
+
+# Параметры-время в ключе кэша обрезаются до даты: окно period_days считается шлюзом
+# от текущего момента, и без обрезки ключ каждого анализа уникален.
+# Подставить ETag от соседнего окна безопасно: 304 придет, только если ответ совпадает
+ETAG_TIME_PARAMS = ('since', 'until')
+
+# Редко меняющиеся ресурсы (репозиторий, языки, контрибьюторы) хранятся без TTL:
+# ETag проверяется при каждом запросе, поэтому устаревшие данные не вернутся
+STATIC_ETAG_CACHE = LRUCache(maxsize=512)
+STATIC_ENDPOINT_RE = re.compile(r'repos/[^/]+/[^/]+(/languages|/contributors)?')
+
 # Headers для GitHub API
 headers = {
-    'Accept': 'application/vnd.github.v3+json'
+    'Accept': 'application/vnd.github.v3+json',
+    # Списки коммитов/issues сжимаются в несколько раз; httpx распаковывает ответ сам (br - через brotli)
+    'Accept-Encoding': 'gzip, deflate, br'
 }
 if GITHUB_TOKEN:
     headers['Authorization'] = f'token {GITHUB_TOKEN}'
@@ -46,41 +138,274 @@ else:
     logger.warning("No GitHub token configured - API rate limits will be restricted")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Общий клиент GitHub API: keep-alive соединения переиспользуются всеми запросами"""
+    app.state.http = httpx.AsyncClient(
+        base_url=GITHUB_API_URL,
+        headers=headers,
+        timeout=30,
+        # retries - повтор только неудачных подключений; ответы 5xx повторяет make_github_request.
+        # HTTP/2: параллельные страницы коммитов идут потоками в одном TLS-соединении
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60)
+        )
+    )
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="GitHub Service",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
 class AnalysisRequest(BaseModel):
+    """Запрос от шлюза: даты уже посчитаны, лишние поля - ошибка вызывающей стороны"""
+    model_config = ConfigDict(extra='forbid')
+    
     owner: str
     repo_name: str
     start_date: str
     end_date: str
 
 
-def make_github_request(endpoint: str, params: Dict = None) -> Any:
-    """Выполнить запрос к GitHub API"""
-    url = f"{GITHUB_API_URL}/{endpoint}"
+class AnalyzeResponse(BaseModel):
+    """Ответ /analyze (поля как у ActivityStats в shared/models.py + success)"""
+    success: bool
+    repo_info: Dict[str, Any]
+    commit_stats: Dict[str, Any]
+    contributors: List[Dict[str, Any]] = Field(default_factory=list)
+    total_contributors: int = 0
+    issue_stats: Optional[Dict[str, Any]] = None
+    pr_stats: Optional[Dict[str, Any]] = None
+    language_stats: Optional[Dict[str, Any]] = None
+    analysis_period_days: int
+    activity_index: float = 0.0
+    start_date: str
+    end_date: str
+
+
+class RateLimiter:
+    """
+    Ограничение параллельных запросов к GitHub и ожидание сброса лимита:
+    когда X-RateLimit-Remaining падает ниже min_remaining, запросы ждут X-RateLimit-Reset
+    """
     
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        
-        # Логирование лимитов
-        remaining = response.headers.get('X-RateLimit-Remaining')
-        limit = response.headers.get('X-RateLimit-Limit')
+    def __init__(self, max_concurrent: int = 10, min_remaining: int = 50, max_wait: float = 10.0):
+        self.sem = asyncio.Semaphore(max_concurrent)
+        self.min_remaining = min_remaining
+        self.max_wait = max_wait
+        self.remaining = 5000
+        self.reset_at = 0.0
+    
+    async def wait(self):
+        """Дождаться сброса лимита, если он почти исчерпан (вызывается под self.sem)"""
+        now = time.time()
+        if self.remaining < self.min_remaining and now < self.reset_at:
+            delay = self.reset_at - now
+            # Ждать дольше таймаута шлюза бессмысленно - сразу сообщаем об исчерпании лимита
+            if delay > self.max_wait:
+                raise HTTPException(status_code=403, detail="GitHub API rate limit exceeded")
+            logger.warning(f"GitHub API rate limit almost exhausted, waiting {delay:.1f}s")
+            await asyncio.sleep(delay)
+    
+    def update(self, response_headers: httpx.Headers):
+        """Обновить состояние по заголовкам ответа"""
+        remaining = response_headers.get('X-RateLimit-Remaining')
+        reset = response_headers.get('X-RateLimit-Reset')
+        limit = response_headers.get('X-RateLimit-Limit')
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset:
+            self.reset_at = float(reset)
         if remaining and limit:
             logger.info(f"GitHub API rate limit: {remaining}/{limit}")
+
+
+rate_limiter = RateLimiter()
+
+
+def etag_cache_key(endpoint: str, params: Optional[Dict]) -> Tuple:
+    """Ключ ETAG_CACHE: время в since/until учитывается с точностью до дня"""
+    if not params:
+        return endpoint, None
+    return endpoint, frozenset(
+        (name, value[:10] if name in ETAG_TIME_PARAMS and isinstance(value, str) else value)
+        for name, value in params.items()
+    )
+
+
+async def make_github_page_request(endpoint: str, params: Dict = None) -> Tuple[Any, Optional[str]]:
+    """Выполнить запрос к GitHub API: (тело ответа, заголовок Link для пагинации)"""
+    cache = STATIC_ETAG_CACHE if STATIC_ENDPOINT_RE.fullmatch(endpoint) else ETAG_CACHE
+    cache_key = etag_cache_key(endpoint, params)
+    cached = cache.get(cache_key)
+    request_headers = {'If-None-Match': cached[0]} if cached else None
+    
+    try:
+        async with rate_limiter.sem:
+            for attempt in range(GITHUB_MAX_RETRIES + 1):
+                await rate_limiter.wait()
+                response = await app.state.http.get(f"/{endpoint}", params=params, headers=request_headers)
+                rate_limiter.update(response.headers)
+                if response.status_code not in GITHUB_RETRY_STATUSES or attempt == GITHUB_MAX_RETRIES:
+                    break
+                logger.warning(f"GitHub API returned {response.status_code} for {endpoint}, retrying...")
+                await asyncio.sleep(GITHUB_RETRY_BACKOFF * 2 ** attempt)
         
-        if response.status_code == 200:
-            return response.json()
+        if response.status_code == 304 and cached:
+            return cached[1], cached[2]
+        elif response.status_code == 200:
+            data = orjson.loads(response.content)
+            link = response.headers.get('Link')
+            etag = response.headers.get('ETag')
+            if etag:
+                cache[cache_key] = (etag, data, link)
+            return data, link
         elif response.status_code == 404:
             raise HTTPException(status_code=404, detail="Repository not found")
         elif response.status_code == 403:
             raise HTTPException(status_code=403, detail="GitHub API rate limit exceeded")
         else:
-            error_msg = response.json().get('message', f'HTTP {response.status_code}')
+            error_msg = orjson.loads(response.content).get('message', f'HTTP {response.status_code}')
             raise HTTPException(status_code=response.status_code, detail=error_msg)
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request error: {e}")
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
 
 
+async def make_github_request(endpoint: str, params: Dict = None) -> Any:
+    """Выполнить запрос к GitHub API"""
+    data, _ = await make_github_page_request(endpoint, params)
+    return data
+
+
+async def graphql_request(query: str, variables: Dict) -> Optional[Dict]:
+    """Выполнить GraphQL-запрос: repository из ответа или None при ошибке"""
+    try:
+        response = await app.state.http.post(
+            "/graphql",
+            json={"query": query, "variables": variables},
+            headers={'Authorization': f'bearer {GITHUB_TOKEN}'}
+        )
+        payload = orjson.loads(response.content)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"GraphQL request failed: {e}")
+        return None
+    
+    repo = (payload.get('data') or {}).get('repository')
+    if response.status_code != 200 or payload.get('errors') or not repo:
+        logger.warning(f"GraphQL returned errors: {payload.get('errors') or response.status_code}")
+        return None
+    
+    return repo
+
+
+def commit_history(repo: Dict) -> Optional[Dict]:
+    """Страница истории коммитов ветки по умолчанию (None - пустой репозиторий)"""
+    target = (repo.get('defaultBranchRef') or {}).get('target') or {}
+    return target.get('history')
+
+
+async def fetch_graphql_commits(owner: str, repo_name: str, since_date: str, history: Optional[Dict]) -> Optional[Dict]:
+    """
+    Дочитать историю коммитов по курсору, начиная с уже полученной первой страницы.
+    Курсор следующей страницы известен только из предыдущей, поэтому страницы идут последовательно
+    """
+    pages = []
+    while history:
+        pages.append([node.get('author') or {} for node in history['nodes']])
+        page_info = history['pageInfo']
+        if not page_info['hasNextPage'] or len(pages) >= COMMITS_MAX_PAGES:
+            break
+        
+        repo = await graphql_request(GITHUB_COMMITS_QUERY, {
+            "owner": owner, "name": repo_name,
+            "commitsSince": since_date, "cursor": page_info['endCursor']
+        })
+        if not repo:
+            return None
+        history = commit_history(repo)
+    
+    return summarize_commits(pages)
+
+
+async def fetch_graphql_overview(owner: str, repo_name: str, since_date: str) -> Optional[Dict]:
+    """
+    Информация о репозитории, коммиты, issues, pull requests и языки через GraphQL.
+    None - GraphQL недоступен или вернул ошибку, нужно использовать REST
+    """
+    if not GITHUB_TOKEN:
+        return None
+    
+    repo = await graphql_request(GITHUB_GRAPHQL_QUERY, {
+        "owner": owner, "name": repo_name, "since": since_date, "commitsSince": since_date
+    })
+    if not repo:
+        logger.warning("Falling back to REST")
+        return None
+    
+    commit_stats = await fetch_graphql_commits(owner, repo_name, since_date, commit_history(repo))
+    if commit_stats is None:
+        logger.warning("Falling back to REST")
+        return None
+    
+    return {
+        'repo_info': {
+            "full_name": repo['nameWithOwner'],
+            "owner": repo['owner']['login'],
+            "name": repo['name'],
+            "description": repo.get('description'),
+            "language": (repo.get('primaryLanguage') or {}).get('name'),
+            "stargazers_count": repo.get('stargazerCount', 0),
+            "forks_count": repo.get('forkCount', 0),
+            "subscribers_count": repo['watchers']['totalCount'],
+            # В REST open_issues_count включает открытые pull requests
+            "open_issues_count": repo['openIssues']['totalCount'] + repo['openPullRequests']['totalCount'],
+            "watchers_count": repo.get('stargazerCount', 0),
+            "size": repo.get('diskUsage') or 0,
+            "default_branch": (repo.get('defaultBranchRef') or {}).get('name', 'main'),
+            "created_at": repo.get('createdAt'),
+            "updated_at": repo.get('updatedAt'),
+            "pushed_at": repo.get('pushedAt'),
+            "html_url": repo.get('url'),
+            "topics": [node['topic']['name'] for node in repo['repositoryTopics']['nodes']],
+            "has_issues": repo.get('hasIssuesEnabled', True),
+            "has_projects": repo.get('hasProjectsEnabled', True),
+            "has_wiki": repo.get('hasWikiEnabled', True),
+        },
+        'commit_stats': commit_stats,
+        # Узлы GraphQL приводятся к виду ответов REST и считаются теми же функциями
+        'issue_stats': summarize_issues([
+            {'state': issue['state'].lower(), 'labels': issue['labels']['nodes']}
+            for issue in repo['issues']['nodes']
+        ]),
+        'pr_stats': summarize_pull_requests([
+            {'state': 'open' if pr['state'] == 'OPEN' else 'closed', 'merged_at': pr.get('mergedAt')}
+            for pr in repo['pullRequests']['nodes']
+        ]),
+        'language_stats': summarize_languages({
+            edge['node']['name']: edge['size'] for edge in repo['languages']['edges']
+        })
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Проверка здоровья сервиса"""
@@ -97,32 +422,10 @@ async def get_repo_info(owner: str, repo_name: str):
     """Получить базовую информацию о репозитории"""
     try:
         logger.info(f"Fetching repo info: {owner}/{repo_name}")
-        repo_data = make_github_request(f"repos/{owner}/{repo_name}")
         
         return {
             "success": True,
-            "repo_info": {
-                "full_name": repo_data['full_name'],
-                "owner": repo_data['owner']['login'],
-                "name": repo_data['name'],
-                "description": repo_data.get('description'),
-                "language": repo_data.get('language'),
-                "stargazers_count": repo_data.get('stargazers_count', 0),
-                "forks_count": repo_data.get('forks_count', 0),
-                "subscribers_count": repo_data.get('subscribers_count', 0),
-                "open_issues_count": repo_data.get('open_issues_count', 0),
-                "watchers_count": repo_data.get('watchers_count', 0),
-                "size": repo_data.get('size', 0),
-                "default_branch": repo_data.get('default_branch', 'main'),
-                "created_at": repo_data.get('created_at'),
-                "updated_at": repo_data.get('updated_at'),
-                "pushed_at": repo_data.get('pushed_at'),
-                "html_url": repo_data.get('html_url'),
-                "topics": repo_data.get('topics', []),
-                "has_issues": repo_data.get('has_issues', True),
-                "has_projects": repo_data.get('has_projects', True),
-                "has_wiki": repo_data.get('has_wiki', True),
-            }
+            "repo_info": await fetch_repo_info(owner, repo_name)
         }
     
     except HTTPException:
@@ -132,8 +435,26 @@ async def get_repo_info(owner: str, repo_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/analyze")
+@app.post("/analyze", response_model=AnalyzeResponse, response_class=ORJSONResponse)
 async def analyze_repository(request: AnalysisRequest):
+    """Анализ репозитория с ограничением числа одновременных анализов"""
+    try:
+        await asyncio.wait_for(ANALYSIS_SEM.acquire(), timeout=ANALYSIS_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error(f"Analysis rejected: {MAX_CONCURRENT_ANALYSES} analyses already running")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many concurrent analyses, try again later",
+            headers={"Retry-After": str(ANALYSIS_RETRY_AFTER)}
+        )
+    
+    try:
+        return await run_analysis(request)
+    finally:
+        ANALYSIS_SEM.release()
+
+
+async def run_analysis(request: AnalysisRequest) -> Dict:
     """
     Полный анализ репозитория:
     - Коммиты
@@ -145,35 +466,36 @@ async def analyze_repository(request: AnalysisRequest):
     try:
         owner = request.owner
         repo_name = request.repo_name
-        start_date = datetime.fromisoformat(request.start_date.replace('Z', '+00:00'))
-        end_date = datetime.fromisoformat(request.end_date.replace('Z', '+00:00'))
+        # Python 3.11+ разбирает ISO 8601 с суффиксом Z без замены на +00:00
+        start_date = datetime.fromisoformat(request.start_date)
+        end_date = datetime.fromisoformat(request.end_date)
         days = (end_date - start_date).days + 1
         
         logger.info(f"Starting analysis: {owner}/{repo_name} ({days} days)")
         
-        # 1. Базовая информация о репозитории
-        repo_info_response = await get_repo_info(owner, repo_name)
-        repo_info = repo_info_response['repo_info']
-        
-        # 2. Сбор коммитов
-        logger.info("Fetching commits...")
-        commits_data = fetch_commits(owner, repo_name, request.start_date)
-        
-        # 3. Получение контрибьюторов
-        logger.info("Fetching contributors...")
-        contributors_data = fetch_contributors(owner, repo_name)
-        
-        # 4. Статистика по issues
-        logger.info("Fetching issues...")
-        issues_data = fetch_issues(owner, repo_name, request.start_date)
-        
-        # 5. Статистика по pull requests
-        logger.info("Fetching pull requests...")
-        prs_data = fetch_pull_requests(owner, repo_name, request.start_date)
+        # Запросы к GitHub независимы и выполняются параллельно
+        logger.info("Fetching repo overview and contributors...")
+        overview, contributors_data = await asyncio.gather(
+            fetch_graphql_overview(owner, repo_name, request.start_date),
+            fetch_contributors(owner, repo_name)
+        )
         
-        # 6. Языки программирования
-        logger.info("Fetching languages...")
-        languages_data = fetch_languages(owner, repo_name)
+        if overview:
+            repo_info = overview['repo_info']
+            commits_data = overview['commit_stats']
+            issues_data = overview['issue_stats']
+            prs_data = overview['pr_stats']
+            languages_data = overview['language_stats']
+        else:
+            # Без токена (или при ошибке GraphQL) - отдельные REST-запросы
+            logger.info("Fetching repo info, commits, issues, pull requests and languages via REST...")
+            repo_info, commits_data, issues_data, prs_data, languages_data = await asyncio.gather(
+                fetch_repo_info(owner, repo_name),
+                fetch_commits(owner, repo_name, request.start_date),
+                fetch_issues(owner, repo_name, request.start_date),
+                fetch_pull_requests(owner, repo_name, request.start_date),
+                fetch_languages(owner, repo_name)
+            )
         
         # 7. Расчет метрик
         avg_commits_per_day = commits_data['total_commits'] / days if days > 0 else 0
@@ -214,44 +536,55 @@ async def analyze_repository(request: AnalysisRequest):
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
-def fetch_commits(owner: str, repo_name: str, since_date: str) -> Dict:
-    """Получить все коммиты за период"""
-    total_commits = 0
-    commits_by_author = defaultdict(int)
-    commits_by_day = defaultdict(int)
-    page = 1
-    max_pages = 10  # Ограничение для защиты от больших репозиториев
-    
-    while page <= max_pages:
-        commits = make_github_request(
-            f"repos/{owner}/{repo_name}/commits",
-            params={'since': since_date, 'per_page': 100, 'page': page}
-        )
-        
-        if not commits:
-            break
-        
-        for commit in commits:
-            total_commits += 1
-            
-            # Автор
-            author = commit.get('commit', {}).get('author', {}).get('name', 'Unknown')
-            commits_by_author[author] += 1
-            
-            # День
-            date_str = commit.get('commit', {}).get('author', {}).get('date', '')
-            if date_str:
-                day = date_str.split('T')[0]
-                commits_by_day[day] += 1
-        
-        if len(commits) < 100:
-            break
-        
-        page += 1
+def build_repo_info(repo_data: Dict) -> Dict:
+    """Информация о репозитории из ответа REST API repos/{owner}/{repo}"""
+    return {
+        "full_name": repo_data['full_name'],
+        "owner": repo_data['owner']['login'],
+        "name": repo_data['name'],
+        "description": repo_data.get('description'),
+        "language": repo_data.get('language'),
+        "stargazers_count": repo_data.get('stargazers_count', 0),
+        "forks_count": repo_data.get('forks_count', 0),
+        "subscribers_count": repo_data.get('subscribers_count', 0),
+        "open_issues_count": repo_data.get('open_issues_count', 0),
+        "watchers_count": repo_data.get('watchers_count', 0),
+        "size": repo_data.get('size', 0),
+        "default_branch": repo_data.get('default_branch', 'main'),
+        "created_at": repo_data.get('created_at'),
+        "updated_at": repo_data.get('updated_at'),
+        "pushed_at": repo_data.get('pushed_at'),
+        "html_url": repo_data.get('html_url'),
+        "topics": repo_data.get('topics', []),
+        "has_issues": repo_data.get('has_issues', True),
+        "has_projects": repo_data.get('has_projects', True),
+        "has_wiki": repo_data.get('has_wiki', True),
+    }
+
+
+async def fetch_repo_info(owner: str, repo_name: str) -> Dict:
+    """Получить базовую информацию о репозитории"""
+    return build_repo_info(await make_github_request(f"repos/{owner}/{repo_name}"))
+
+
+def utc_day(timestamp: str) -> str:
+    """День коммита по UTC: GraphQL отдает время со смещением автора, REST - в UTC"""
+    return datetime.fromisoformat(timestamp).astimezone(timezone.utc).date().isoformat()
+
+
+def summarize_commits(pages: List[List[Dict]]) -> Dict:
+    """Статистика коммитов по страницам авторов ({name, date}) - общий формат REST и GraphQL"""
+    authors = list(chain.from_iterable(pages))
+    
+    # Автор и день коммита: Counter считает в C за один проход по каждому полю
+    commits_by_author = Counter([author.get('name') or 'Unknown' for author in authors])
+    commits_by_day = Counter([utc_day(author['date']) for author in authors if author.get('date')])
+    
+    total_commits = len(authors)
     
     # Самый активный день и автор
-    most_active_day = max(commits_by_day.items(), key=lambda x: x[1])[0] if commits_by_day else None
-    most_active_author = max(commits_by_author.items(), key=lambda x: x[1])[0] if commits_by_author else None
+    most_active_day = commits_by_day.most_common(1)[0][0] if commits_by_day else None
+    most_active_author = commits_by_author.most_common(1)[0][0] if commits_by_author else None
     
     return {
         'total_commits': total_commits,
@@ -262,9 +595,32 @@ def fetch_commits(owner: str, repo_name: str, since_date: str) -> Dict:
     }
 
 
-def fetch_contributors(owner: str, repo_name: str) -> Dict:
+async def fetch_commits(owner: str, repo_name: str, since_date: str) -> Dict:
+    """Получить все коммиты за период"""
+    endpoint = f"repos/{owner}/{repo_name}/commits"
+    params = {'since': since_date, 'per_page': 100}
+    
+    # Первая страница сообщает номер последней в Link: остальные запрашиваются параллельно
+    first_page, link = await make_github_page_request(endpoint, params={**params, 'page': 1})
+    pages = [first_page] if first_page else []
+    
+    last_page_match = LAST_PAGE_RE.search(link or '')
+    if pages and last_page_match:
+        last_page = min(int(last_page_match.group(1)), COMMITS_MAX_PAGES)
+        pages += await asyncio.gather(*(
+            make_github_request(endpoint, params={**params, 'page': page})
+            for page in range(2, last_page + 1)
+        ))
+    
+    return summarize_commits([
+        [commit.get('commit', {}).get('author', {}) for commit in commits]
+        for commits in pages
+    ])
+
+
+async def fetch_contributors(owner: str, repo_name: str) -> Dict:
     """Получить список контрибьюторов"""
-    contributors_list = make_github_request(f"repos/{owner}/{repo_name}/contributors")
+    contributors_list = await make_github_request(f"repos/{owner}/{repo_name}/contributors")
     
     contributors = []
     for contributor in contributors_list[:50]:  # Топ 50 контрибьюторов
@@ -281,41 +637,30 @@ def fetch_contributors(owner: str, repo_name: str) -> Dict:
     }
 
 
-def fetch_issues(owner: str, repo_name: str, since_date: str) -> Dict:
+def summarize_issues(issues: List[Dict]) -> Dict:
+    """Статистика по списку issues в формате REST API"""
+    # Пропускаем PR (они тоже возвращаются в /issues)
+    real_issues = [issue for issue in issues if 'pull_request' not in issue]
+    states = Counter(issue['state'] for issue in real_issues)
+    issues_by_label = Counter(label['name'] for issue in real_issues for label in issue.get('labels', ()))
+    
+    return {
+        'total_issues': len(real_issues),
+        'open_issues': states['open'],
+        'closed_issues': len(real_issues) - states['open'],
+        'issues_by_label': dict(issues_by_label)
+    }
+
+
+async def fetch_issues(owner: str, repo_name: str, since_date: str) -> Dict:
     """Получить статистику по issues"""
     try:
-        issues = make_github_request(
+        issues = await make_github_request(
             f"repos/{owner}/{repo_name}/issues",
             params={'state': 'all', 'since': since_date, 'per_page': 100}
         )
         
-        total_issues = 0
-        open_issues = 0
-        closed_issues = 0
-        issues_by_label = defaultdict(int)
-        
-        for issue in issues:
-            # Пропускаем PR (они тоже возвращаются в /issues)
-            if 'pull_request' in issue:
-                continue
-            
-            total_issues += 1
-            
-            if issue['state'] == 'open':
-                open_issues += 1
-            else:
-                closed_issues += 1
-            
-            # Метки
-            for label in issue.get('labels', []):
-                issues_by_label[label['name']] += 1
-        
-        return {
-            'total_issues': total_issues,
-            'open_issues': open_issues,
-            'closed_issues': closed_issues,
-            'issues_by_label': dict(issues_by_label)
-        }
+        return summarize_issues(issues)
     
     except Exception as e:
         logger.warning(f"Could not fetch issues: {e}")
@@ -327,35 +672,40 @@ def fetch_issues(owner: str, repo_name: str, since_date: str) -> Dict:
         }
 
 
-def fetch_pull_requests(owner: str, repo_name: str, since_date: str) -> Dict:
+def summarize_pull_requests(prs: List[Dict]) -> Dict:
+    """Статистика по списку pull requests в формате REST API"""
+    total_prs = 0
+    open_prs = 0
+    closed_prs = 0
+    merged_prs = 0
+    
+    for pr in prs:
+        total_prs += 1
+        
+        if pr['state'] == 'open':
+            open_prs += 1
+        else:
+            closed_prs += 1
+            if pr.get('merged_at'):
+                merged_prs += 1
+    
+    return {
+        'total_prs': total_prs,
+        'open_prs': open_prs,
+        'closed_prs': closed_prs,
+        'merged_prs': merged_prs
+    }
+
+
+async def fetch_pull_requests(owner: str, repo_name: str, since_date: str) -> Dict:
     """Получить статистику по pull requests"""
     try:
-        prs = make_github_request(
+        prs = await make_github_request(
             f"repos/{owner}/{repo_name}/pulls",
             params={'state': 'all', 'per_page': 100}
         )
         
-        total_prs = 0
-        open_prs = 0
-        closed_prs = 0
-        merged_prs = 0
-        
-        for pr in prs:
-            total_prs += 1
-            
-            if pr['state'] == 'open':
-                open_prs += 1
-            else:
-                closed_prs += 1
-                if pr.get('merged_at'):
-                    merged_prs += 1
-        
-        return {
-            'total_prs': total_prs,
-            'open_prs': open_prs,
-            'closed_prs': closed_prs,
-            'merged_prs': merged_prs
-        }
+        return summarize_pull_requests(prs)
     
     except Exception as e:
         logger.warning(f"Could not fetch pull requests: {e}")
@@ -367,26 +717,31 @@ def fetch_pull_requests(owner: str, repo_name: str, since_date: str) -> Dict:
         }
 
 
-def fetch_languages(owner: str, repo_name: str) -> Dict:
+def summarize_languages(languages: Dict[str, int]) -> Dict:
+    """Статистика по языкам: {язык: байты}"""
+    if not languages:
+        return {
+            'languages': {},
+            'primary_language': None,
+            'total_bytes': 0
+        }
+    
+    total_bytes = sum(languages.values())
+    primary_language = max(languages, key=languages.get)
+    
+    return {
+        'languages': languages,
+        'primary_language': primary_language,
+        'total_bytes': total_bytes
+    }
+
+
+async def fetch_languages(owner: str, repo_name: str) -> Dict:
     """Получить статистику по языкам программирования"""
     try:
-        languages = make_github_request(f"repos/{owner}/{repo_name}/languages")
-        
-        if not languages:
-            return {
-                'languages': {},
-                'primary_language': None,
-                'total_bytes': 0
-            }
-        
-        total_bytes = sum(languages.values())
-        primary_language = max(languages.items(), key=lambda x: x[1])[0] if languages else None
+        languages = await make_github_request(f"repos/{owner}/{repo_name}/languages")
         
-        return {
-            'languages': languages,
-            'primary_language': primary_language,
-            'total_bytes': total_bytes
-        }
+        return summarize_languages(languages)
     
     except Exception as e:
         logger.warning(f"Could not fetch languages: {e}")
@@ -399,4 +754,4 @@ def fetch_languages(owner: str, repo_name: str) -> Dict:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop="uvloop", http="httptools")
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Тесты GitHub Service: pytest services/github-service
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+
+@pytest.fixture
+def github_requests(monkeypatch):
+    """Подменяет GitHub API: первый ответ с ETag, дальше 304 на совпадающий If-None-Match"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get('If-None-Match') == '"etag-1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=[{"sha": "abc"}], headers={"ETag": '"etag-1"'})
+
+    main.ETAG_CACHE.clear()
+    monkeypatch.setattr(main.app.state, "http", httpx.AsyncClient(
+        base_url=main.GITHUB_API_URL, transport=httpx.MockTransport(handler)
+    ), raising=False)
+    return requests
+
+
+def test_repeated_analysis_revalidates_with_etag(github_requests):
+    # Окна period_days двух анализов подряд отличаются на доли секунды
+    endpoint = "repos/octocat/hello-world/commits"
+    first = {'since': "2024-01-01T10:00:00.123456Z", 'per_page': 100}
+    second = {'since': "2024-01-01T10:00:01.654321Z", 'per_page': 100}
+
+    async def analyze_twice():
+        return (
+            await main.make_github_request(endpoint, params=first),
+            await main.make_github_request(endpoint, params=second)
+        )
+
+    first_data, second_data = asyncio.run(analyze_twice())
+
+    assert 'If-None-Match' not in github_requests[0].headers
+    assert github_requests[1].headers['If-None-Match'] == '"etag-1"'
+    assert second_data == first_data == [{"sha": "abc"}]
+
+
+def test_commits_are_bucketed_by_utc_day():
+    # GraphQL: время в смещении автора; REST: UTC с суффиксом Z
+    pages = [
+        [{"name": "alice", "date": "2024-01-02T23:30:00-05:00"}],
+        [{"name": "bob", "date": "2024-01-03T01:00:00Z"}, {"name": None, "date": "2024-01-02T12:00:00+03:00"}],
+    ]
+
+    stats = main.summarize_commits(pages)
+
+    assert stats['commits_by_day'] == {"2024-01-03": 2, "2024-01-02": 1}
+    assert stats['most_active_day'] == "2024-01-03"
+    assert stats['commits_by_author'] == {"alice": 1, "bob": 1, "Unknown": 1}